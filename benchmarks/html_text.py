@@ -0,0 +1,90 @@
+"""Benchmark of the HTML to text backends on a synthetic corpus of large notes.
+
+Run from the repository root with ``python -m benchmarks.html_text``.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import os
+import random
+import string
+import time
+
+from engines.html_text import PARAGRAPH_SEPARATOR, html_to_text, html_to_texts
+
+
+def random_sentence(rng, n_words):
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        for _ in range(n_words)
+    ]
+    # Inline formatting as produced by the note editor
+    i = rng.randrange(n_words)
+    words[i] = rng.choice(["<b>{}</b>", "<i>{}</i>", "<u>{}</u>"]).format(words[i])
+    return " ".join(words) + "."
+
+
+def random_note(rng, n_blocks):
+    blocks = []
+    for _ in range(n_blocks):
+        kind = rng.random()
+        if kind < 0.1:
+            blocks.append(f"<h2>{random_sentence(rng, 4)}</h2>")
+        elif kind < 0.25:
+            items = "".join(
+                f"<li><p>{random_sentence(rng, 8)}</p></li>"
+                for _ in range(rng.randint(2, 6))
+            )
+            blocks.append(f"<ul>{items}</ul>")
+        else:
+            sentences = [random_sentence(rng, 12) for _ in range(rng.randint(2, 8))]
+            blocks.append(f"<p>{' '.join(sentences)}<br>&nbsp;</p>")
+    return "".join(blocks)
+
+
+def bench(name, fn, notes):
+    n_bytes = sum(len(n) for n in notes)
+    start = time.perf_counter()
+    results = fn(notes)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<16} {len(notes) / elapsed:>10.1f} notes/s "
+        f"{n_bytes / elapsed / 1024**2:>8.1f} MB/s"
+    )
+    return results
+
+
+def main():
+    rng = random.Random(0)
+    notes = [random_note(rng, rng.randint(50, 400)) for _ in range(400)]
+    print(f"{len(notes)} notes, {sum(len(n) for n in notes) / 1024**2:.1f} MB")
+
+    backends = ["stdlib"]
+    if importlib.util.find_spec("bs4") is not None:
+        backends.insert(0, "bs4")
+    if importlib.util.find_spec("lxml") is not None:
+        backends.append("lxml")
+
+    for backend in backends:
+        texts = bench(
+            backend, lambda ns: [html_to_text(n, backend) for n in ns], notes
+        )
+        if backend != "bs4":
+            # The headings, paragraphs and list items stay separate
+            assert all(PARAGRAPH_SEPARATOR in t for t in texts)
+
+    backend = backends[-1]
+    n_workers = os.cpu_count()
+    with ProcessPoolExecutor(n_workers) as executor:
+        # Start the workers before timing
+        html_to_texts(notes[: 2 * n_workers], backend, executor, n_workers)
+        parallel = bench(
+            f"{backend} x{n_workers}",
+            lambda ns: html_to_texts(ns, backend, executor, n_workers),
+            notes,
+        )
+    assert parallel == [html_to_text(n, backend) for n in notes]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark of the batched Ollama embeddings against a local stub server.
+
+The stub answers like Ollama with a fixed delay per request plus a delay per
+text, and fails a fraction of the requests to exercise the retries.
+
+Run from the repository root with ``python -m benchmarks.ollama_embedding``.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+from engines.ollama_embedding import BatchedOllamaEmbedding
+
+DIM = 768
+REQUEST_DELAY = 0.02
+TEXT_DELAY = 0.001
+FAILURE_RATE = 0.05
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/embed":
+            texts = body["input"]
+            texts = [texts] if isinstance(texts, str) else texts
+        elif self.path == "/api/embeddings":
+            texts = [body["prompt"]]
+        else:
+            self.send_error(404)
+            return
+        if random.random() < self.server.failure_rate:
+            self.send_error(503)
+            return
+
+        time.sleep(REQUEST_DELAY + TEXT_DELAY * len(texts))
+        embeddings = [[float(len(t))] * DIM for t in texts]
+        if self.path == "/api/embed":
+            payload = {"model": body["model"], "embeddings": embeddings}
+        else:
+            payload = {"embedding": embeddings[0]}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench(name, embed_model, texts):
+    start = time.perf_counter()
+    embeddings = embed_model.get_text_embedding_batch(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {len(texts) / elapsed:>10.1f} chunks/s")
+    return embeddings
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.failure_rate = FAILURE_RATE
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    rng = random.Random(0)
+    texts = [f"chunk {i} " + "x" * rng.randint(100, 1000) for i in range(1000)]
+    expected = [[float(len(t))] * DIM for t in texts]
+
+    try:
+        from llama_index.embeddings.ollama import OllamaEmbedding
+
+        # The current path does not retry, measure it without failures
+        server.failure_rate = 0.0
+        embed_model = OllamaEmbedding(model_name="stub", base_url=base_url)
+        bench("OllamaEmbedding", embed_model, texts)
+    except ImportError:
+        print("llama-index-embeddings-ollama is not installed, skipping")
+
+    server.failure_rate = FAILURE_RATE
+    for batch_size, max_concurrent_batches in [(1, 1), (32, 1), (32, 4), (64, 8)]:
+        embed_model = BatchedOllamaEmbedding(
+            "stub",
+            base_url=base_url,
+            batch_size=batch_size,
+            max_concurrent_batches=max_concurrent_batches,
+            backoff=0.01,
+        )
+        embeddings = bench(
+            f"batch {batch_size} x{max_concurrent_batches}", embed_model, texts
+        )
+        assert embeddings == expected, "Embeddings out of order"
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Micro-benchmark of the CLIP tokenizer BPE against the previous implementation.
+
+Run from the repository root with ``python -m benchmarks.tokenizer_bpe``.
+"""
+
+import random
+import string
+import time
+
+from engines.stable_diffusion.model_io import load_tokenizer
+
+
+def reference_bpe(bpe_ranks, text):
+    # The previous implementation, merging the most likely bigram at every
+    # iteration by scanning all the unique bigrams
+    unigrams = list(text[:-1]) + [text[-1] + "</w>"]
+    unique_bigrams = set(zip(unigrams, unigrams[1:]))
+
+    if not unique_bigrams:
+        return unigrams
+
+    while unique_bigrams:
+        bigram = min(unique_bigrams, key=lambda pair: bpe_ranks.get(pair, float("inf")))
+        if bigram not in bpe_ranks:
+            break
+
+        new_unigrams = []
+        skip = False
+        for a, b in zip(unigrams, unigrams[1:]):
+            if skip:
+                skip = False
+                continue
+
+            if (a, b) == bigram:
+                new_unigrams.append(a + b)
+                skip = True
+
+            else:
+                new_unigrams.append(a)
+
+        if not skip:
+            new_unigrams.append(b)
+
+        unigrams = new_unigrams
+        unique_bigrams = set(zip(unigrams, unigrams[1:]))
+
+    return unigrams
+
+
+def random_words(n_words, seed=0):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 16)))
+        for _ in range(n_words)
+    ]
+
+
+def bench(name, fn, words):
+    start = time.perf_counter()
+    results = [fn(w) for w in words]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {len(words) / elapsed:>12.0f} words/s")
+    return results
+
+
+def main():
+    tokenizer = load_tokenizer("stabilityai/sdxl-turbo")
+    words = random_words(20000)
+
+    # Uncached merges
+    expected = bench(
+        "reference", lambda w: reference_bpe(tokenizer.bpe_ranks, w), words
+    )
+    results = bench("heap", tokenizer._merge, words)
+    assert results == expected, "BPE results differ from the reference"
+
+    # Cached words, the prompts of note thumbnails repeat a small vocabulary
+    repeated = random_words(500) * 40
+    bench("lru cache", tokenizer.bpe, repeated)
+
+    # Batch tokenization into a padded array
+    prompts = [" ".join(random_words(12, seed=i)) for i in range(1000)]
+    start = time.perf_counter()
+    tokenizer.tokenize_batch(prompts, max_length=77)
+    elapsed = time.perf_counter() - start
+    print(f"{'batch':<12} {len(prompts) / elapsed:>12.0f} prompts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import os
+import threading
+
+import torch
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from transformers import AutoModel, AutoTokenizer
+
+
+def infer_device(device: Optional[str] = None) -> str:
+    # Fall back to the CPU when the requested accelerator is not available
+    if device == "mps" and torch.backends.mps.is_available():
+        return device
+    if device is not None and device.startswith("cuda") and torch.cuda.is_available():
+        return device
+    if device is None:
+        if torch.cuda.is_available():
+            return "cuda"
+        if torch.backends.mps.is_available():
+            return "mps"
+    return "cpu"
+
+
+class ColbertScorer:
+    def __init__(
+        self,
+        model="colbert-ir/colbertv2.0",
+        tokenizer="colbert-ir/colbertv2.0",
+        device=None,
+        batch_size=32,
+        max_length=512,
+    ):
+        self.device = infer_device(device)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+        self.model = AutoModel.from_pretrained(model).to(self.device).eval()
+        # The model is shared by all the requests, one forward pass at a time
+        self.lock = threading.Lock()
+
+    @torch.no_grad()
+    def encode_documents(self, texts: List[str]) -> List[torch.Tensor]:
+        """Normalized token embeddings of the documents, stored on the CPU."""
+        embeddings = []
+        # Encode the documents in padded batches instead of one at a time, the
+        # model is released between batches so that queries are not held up by
+        # a large ingestion
+        for i in range(0, len(texts), self.batch_size):
+            with self.lock:
+                doc_encoding = self.tokenizer(
+                    texts[i : i + self.batch_size],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                ).to(self.device)
+                doc_embedding = self.model(**doc_encoding).last_hidden_state
+                doc_embedding = torch.nn.functional.normalize(doc_embedding, dim=-1)
+                # Drop the padding tokens of every document
+                lengths = doc_encoding["attention_mask"].sum(dim=1).tolist()
+                embeddings += [
+                    e[:n].to("cpu", torch.float16)
+                    for e, n in zip(doc_embedding, lengths)
+                ]
+        return embeddings
+
+    @torch.no_grad()
+    def score(
+        self,
+        query: str,
+        texts: List[str],
+        doc_embeddings: Optional[List[Optional[torch.Tensor]]] = None,
+    ) -> List[float]:
+        # Only the documents without precomputed embeddings are encoded
+        doc_embeddings = list(doc_embeddings or [None] * len(texts))
+        missing = [i for i, e in enumerate(doc_embeddings) if e is None]
+        if missing:
+            encoded = self.encode_documents([texts[i] for i in missing])
+            for i, e in zip(missing, encoded):
+                doc_embeddings[i] = e
+
+        with self.lock:
+            query_encoding = self.tokenizer(query, return_tensors="pt").to(self.device)
+            query_embedding = self.model(**query_encoding).last_hidden_state[0]
+            query_embedding = torch.nn.functional.normalize(query_embedding, dim=-1)
+
+        scores = []
+        for doc_embedding in doc_embeddings:
+            doc_embedding = doc_embedding.to(self.device, query_embedding.dtype)
+            # Cosine similarity of every query token with every document token,
+            # take the maximum for each query token then average
+            sim = query_embedding @ doc_embedding.T
+            scores.append(sim.max(dim=1).values.mean().item())
+        return scores
+
+
+class ColbertEmbeddingStore:
+    def __init__(self, store_dir: str, max_cached_bytes=512 * 1024**2):
+        # One file per user mapping node IDs to document token embeddings
+        self.store_dir = store_dir
+        # LRU of the embeddings of the most recently searched users, bounded by
+        # the size of their token matrices
+        self.embeddings = OrderedDict()
+        self.max_cached_bytes = max_cached_bytes
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def path(self, user_id: str) -> str:
+        return os.path.join(self.store_dir, f"{user_id}.pt")
+
+    def __pop(self, user_id: str):
+        entry = self.embeddings.pop(user_id, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def __cache(self, user_id: str, embeddings: Dict[str, torch.Tensor]):
+        self.__pop(user_id)
+        nbytes = sum(e.nbytes for e in embeddings.values())
+        # The embeddings of a user larger than the whole cache are not kept
+        if nbytes > self.max_cached_bytes:
+            return
+        self.embeddings[user_id] = (embeddings, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_cached_bytes:
+            _, (_, evicted) = self.embeddings.popitem(last=False)
+            self.nbytes -= evicted
+
+    def save(self, user_id: str, embeddings: Dict[str, torch.Tensor]):
+        os.makedirs(self.store_dir, exist_ok=True)
+        torch.save(embeddings, self.path(user_id))
+        with self.lock:
+            self.__cache(user_id, embeddings)
+
+    def load(self, user_id: str) -> Dict[str, torch.Tensor]:
+        with self.lock:
+            entry = self.embeddings.get(user_id)
+            if entry is not None:
+                self.embeddings.move_to_end(user_id)
+                return entry[0]
+        path = self.path(user_id)
+        embeddings = torch.load(path) if os.path.exists(path) else {}
+        with self.lock:
+            self.__cache(user_id, embeddings)
+        return embeddings
+
+    def invalidate(self, user_id: str):
+        with self.lock:
+            self.__pop(user_id)
+
+    def delete(self, user_id: str):
+        self.invalidate(user_id)
+        path = self.path(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        with self.lock:
+            self.embeddings.clear()
+            self.nbytes = 0
+
+
+class SharedColbertRerank(BaseNodePostprocessor):
+    """Rerank nodes with a ColBERT scorer shared across requests."""
+
+    top_n: int = Field(description="Number of nodes to return sorted by score.")
+    keep_retrieval_score: bool = Field(
+        default=False, description="Whether to keep the retrieval score in metadata."
+    )
+    _scorer: ColbertScorer = PrivateAttr()
+    _embeddings: Dict[str, torch.Tensor] = PrivateAttr()
+
+    def __init__(
+        self,
+        scorer: ColbertScorer,
+        top_n: int = 5,
+        keep_retrieval_score=False,
+        embeddings: Optional[Dict[str, torch.Tensor]] = None,
+    ):
+        super().__init__(top_n=top_n, keep_retrieval_score=keep_retrieval_score)
+        self._scorer = scorer
+        # Document token embeddings precomputed at ingestion keyed by node ID
+        self._embeddings = embeddings or {}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SharedColbertRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Missing query bundle in extra info.")
+        if len(nodes) == 0:
+            return []
+
+        texts = [
+            node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes
+        ]
+        doc_embeddings = [self._embeddings.get(node.node.node_id) for node in nodes]
+        scores = self._scorer.score(query_bundle.query_str, texts, doc_embeddings)
+        for node, score in zip(nodes, scores):
+            if self.keep_retrieval_score:
+                node.node.metadata["retrieval_score"] = node.score
+            node.score = score
+        return sorted(nodes, key=lambda x: -x.score)[: self.top_n]
@@ -0,0 +1,96 @@
+from collections import Counter
+from typing import Optional
+import math
+import re
+import threading
+
+from llama_index.core.node_parser import SentenceSplitter
+from transformers import pipeline
+
+from engines.colbert_rerank import infer_device
+
+_WORD = re.compile(r"\w+")
+
+
+def rank_passages(
+    question: str, passages: list[str], top_k: int, k1=1.2, b=0.75
+) -> list[str]:
+    # BM25 of the passages against the question words, the best passages are
+    # kept in their original order
+    words = [Counter(_WORD.findall(p.lower())) for p in passages]
+    lengths = [sum(counts.values()) for counts in words]
+    avg_length = sum(lengths) / len(lengths) or 1
+    df = Counter(w for counts in words for w in counts)
+    n = len(passages)
+    terms = set(_WORD.findall(question.lower()))
+    scores = []
+    for counts, length in zip(words, lengths):
+        score = 0.0
+        for t in terms:
+            tf = counts.get(t, 0)
+            if tf == 0:
+                continue
+            idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    best = sorted(range(n), key=lambda i: -scores[i])[:top_k]
+    return [passages[i] for i in sorted(best)]
+
+
+class ExtractiveQA:
+    def __init__(
+        self,
+        model="deepset/roberta-base-squad2",
+        device=None,
+        chunk_size=256,
+        top_k=4,
+        batch_size=4,
+        threshold=0.5,
+    ):
+        self.model = model
+        self.device = device
+        # The note is split into passages short enough for the model window
+        self.splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=20)
+        self.top_k = top_k
+        self.batch_size = batch_size
+        # Minimum span score for the answer to be returned without the LLM
+        self.threshold = threshold
+        # The model is loaded on the first question and then shared
+        self.qa = None
+        self.lock = threading.Lock()
+
+    def get_pipeline(self):
+        if self.qa is None:
+            self.qa = pipeline(
+                "question-answering",
+                model=self.model,
+                tokenizer=self.model,
+                device=infer_device(self.device),
+            )
+        return self.qa
+
+    def answer(self, question: str, context: str) -> Optional[str]:
+        """Answer from a span of the context, None when the model is unsure."""
+        passages = self.splitter.split_text(context)
+        if not passages:
+            return None
+        passages = rank_passages(question, passages, self.top_k)
+        with self.lock:
+            qa = self.get_pipeline()
+            # Questions without an answer in the passages give an empty span
+            results = qa(
+                question=[question] * len(passages),
+                context=passages,
+                batch_size=self.batch_size,
+                handle_impossible_answer=True,
+            )
+        if isinstance(results, dict):
+            results = [results]
+        # A passage without the answer must not hide the span found in another
+        answers = [r for r in results if r["answer"].strip()]
+        if not answers:
+            return None
+        best = max(answers, key=lambda r: r["score"])
+        if best["score"] < self.threshold:
+            return None
+        return best["answer"].strip()
@@ -0,0 +1,145 @@
+from concurrent.futures import Executor
+from functools import partial
+from html.parser import HTMLParser
+import re
+
+try:
+    import lxml.html
+
+    DEFAULT_BACKEND = "lxml"
+except ImportError:
+    DEFAULT_BACKEND = "stdlib"
+
+# Block elements end a paragraph, the SentenceSplitter splits paragraphs on
+# three newlines by default
+PARAGRAPH_SEPARATOR = "\n\n\n"
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "figcaption",
+    "figure",
+    "footer",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "tr",
+    "ul",
+}
+SKIP_TAGS = {"script", "style"}
+
+_TRAILING_SPACES = re.compile(r"[ \t]+\n")
+_BLOCK_BREAKS = re.compile(r"\n{2,}")
+
+
+def _normalize(text: str) -> str:
+    # Block boundaries are marked with two newlines and line breaks with one
+    text = _TRAILING_SPACES.sub("\n", text)
+    return _BLOCK_BREAKS.sub(PARAGRAPH_SEPARATOR, text.strip())
+
+
+class _TextExtractor(HTMLParser):
+    """Streaming tag stripper keeping the block boundaries."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def _stdlib_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return _normalize("".join(extractor.parts))
+
+
+def _lxml_to_text(html: str) -> str:
+    if not html.strip():
+        return ""
+    root = lxml.html.fromstring(html)
+    for el in list(root.iter(*SKIP_TAGS)):
+        if el is not root:
+            el.drop_tree()
+    # Mark the boundaries in the tails so that text_content keeps them
+    for el in root.iter("br"):
+        el.tail = "\n" + (el.tail or "")
+    for el in root.iter(*BLOCK_TAGS):
+        el.tail = "\n\n" + (el.tail or "")
+    return _normalize(root.text_content())
+
+
+def _bs4_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    # Previous extraction, the block boundaries are lost
+    soup = BeautifulSoup(html, features="html.parser")
+    return soup.get_text()
+
+
+_BACKENDS = {
+    "lxml": _lxml_to_text,
+    "stdlib": _stdlib_to_text,
+    "bs4": _bs4_to_text,
+}
+
+
+def html_to_text(html: str, backend: str = DEFAULT_BACKEND) -> str:
+    """Extract the text of an HTML note, one paragraph per block element."""
+    if backend not in _BACKENDS:
+        raise ValueError(
+            f"'{backend}' backend not found, choose one of {{{','.join(_BACKENDS)}}}"
+        )
+    return _BACKENDS[backend](html)
+
+
+def html_to_texts(
+    htmls: list[str],
+    backend: str = DEFAULT_BACKEND,
+    executor: Executor = None,
+    n_workers: int = 1,
+) -> list[str]:
+    """Extract the text of many HTML notes, across the executor if given.
+
+    The notes are sent to the n_workers workers of the executor in about four
+    chunks per worker.
+    """
+    extract = partial(html_to_text, backend=backend)
+    if executor is None or len(htmls) < 2:
+        return [extract(html) for html in htmls]
+    chunksize = max(1, len(htmls) // (4 * n_workers))
+    return list(executor.map(extract, htmls, chunksize=chunksize))
@@ -0,0 +1,31 @@
+from collections import OrderedDict
+import threading
+
+
+class ImageCache:
+    def __init__(self, max_bytes=256 * 1024**2):
+        # Total size in bytes of the cached images before the least recently
+        # used are evicted
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.imgs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            img_bytes = self.imgs.get(key)
+            if img_bytes is not None:
+                self.imgs.move_to_end(key)
+            return img_bytes
+
+    def put(self, key, img_bytes):
+        if len(img_bytes) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.imgs:
+                self.total_bytes -= len(self.imgs.pop(key))
+            self.imgs[key] = img_bytes
+            self.total_bytes += len(img_bytes)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.imgs.popitem(last=False)
+                self.total_bytes -= len(evicted)
@@ -0,0 +1,44 @@
+import os
+import threading
+import time
+
+
+class ImageStore:
+    def __init__(
+        self, img_dir="images/generated", max_bytes=512 * 1024**2, max_age=None
+    ):
+        self.img_dir = img_dir
+        # Total size in bytes of the stored images before the oldest are evicted
+        self.max_bytes = max_bytes
+        # Age in seconds after which an image is evicted, None keeps images forever
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        os.makedirs(img_dir, exist_ok=True)
+
+    def save(self, img_id, img_bytes, img_format="jpeg") -> str:
+        img_name = f"{self.img_dir}/{img_id}.{img_format}"
+        with open(img_name, "wb") as f:
+            f.write(img_bytes)
+        with self.lock:
+            self.evict()
+        return img_name
+
+    def evict(self):
+        # Collect the stored images from the oldest to the newest
+        entries = []
+        for f in os.scandir(self.img_dir):
+            if f.is_file():
+                stat = f.stat()
+                entries.append((stat.st_mtime, stat.st_size, f.path))
+        entries.sort()
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            if not expired and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+import threading
+import time
+
+from llama_index.core import Settings
+
+
+class IndexBuildScheduler:
+    def __init__(self, max_concurrent_builds=4, max_inflight_embeddings=4):
+        # Number of user indexes built at the same time
+        self.max_concurrent_builds = max_concurrent_builds
+        # Embedding requests sent to the backend at the same time, across all
+        # the builds, so that the backend is kept busy without being flooded
+        self.embedding_slots = threading.BoundedSemaphore(max_inflight_embeddings)
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        embed_model = Settings.embed_model
+        batch_size = embed_model.embed_batch_size
+        embeddings = []
+        for i in range(0, len(texts), batch_size):
+            with self.embedding_slots:
+                embeddings += embed_model.get_text_embedding_batch(
+                    texts[i : i + batch_size]
+                )
+        return embeddings
+
+    def run(
+        self,
+        user_ids: list[str],
+        build: Callable[[str], object],
+        priorities: Optional[dict[str, str]] = None,
+    ) -> dict[str, Exception]:
+        """Build the index of every user, the most recently active users first.
+
+        Returns:
+            dict[str, Exception]: The error of every user whose build failed.
+
+        """
+        # The pool starts the builds in submission order
+        priorities = priorities or {}
+        user_ids = sorted(user_ids, key=lambda u: priorities.get(u, ""), reverse=True)
+        errors = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.max_concurrent_builds) as executor:
+            futures = {executor.submit(build, u): u for u in user_ids}
+            for future in as_completed(futures):
+                user_id = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Failed to build the search index of {user_id}: {e}")
+                    errors[user_id] = e
+        elapsed = time.perf_counter() - start
+        print(f"Indexed the notes of {len(user_ids)} users in {elapsed:.2f}s")
+        return errors
@@ -1,80 +1,179 @@
 from transformers import pipeline
 from llama_index.core import Document, get_response_synthesizer
 from llama_index.core import DocumentSummaryIndex, VectorStoreIndex, StorageContext
-from llama_index.core.readers.json import JSONReader
+from llama_index.core.schema import MetadataMode
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.response_synthesizers import ResponseMode
 from llama_index.core.node_parser import SentenceSplitter
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.core import Settings
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.postprocessor.colbert_rerank import ColbertRerank
-from bs4 import BeautifulSoup
+from engines.colbert_rerank import (
+    ColbertEmbeddingStore,
+    ColbertScorer,
+    SharedColbertRerank,
+)
+from engines.extractive_qa import ExtractiveQA
+from engines.html_text import html_to_text
+from engines.index_scheduler import IndexBuildScheduler
+from engines.ollama_embedding import EMBED_ENDPOINT, BatchedOllamaEmbedding
+from engines.summarizer import PROMPT_VERSION, MapReduceSummarizer
+from engines.streaming import aiter_tokens
+from engines.summary_cache import SummaryCache
 from firebase.firebase_reader import FirebaseFirestoreReader
 from config import *
+import asyncio
 import chromadb
+import hashlib
 import json
 import os
 import shutil
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
 from pathlib import Path
+from typing import Optional
 from models.nlp_models import SearchOutput
 
+# ColBERT document token embeddings computed at ingestion
+COLBERT_DB_LOCAL = "db/colbert"
+# Embedding of the indexes and last modification time of every indexed note,
+# by user and note ID
+SEARCH_MANIFEST_LOCAL = "db/search_manifest.json"
+# Summaries of the notes by content hash, model and prompt version
+SUMMARY_CACHE_LOCAL = "db/summary_cache.sqlite3"
+# Note fields stored as node metadata and returned as search sources
+SOURCE_KEYS = ["id", "thumbnail", "title", "lastModified", "lastAccessed"]
+
 
 class NLPEngine:
-    def __init__(self, model="llama3", embedding="nomic-embed-text", init_db=True):
+    def __init__(
+        self,
+        model="llama3",
+        embedding="nomic-embed-text",
+        init_db=True,
+        incremental_sync=True,
+        max_cached_indexes=32,
+        max_cached_documents=64,
+        max_cached_colbert_bytes=512 * 1024**2,
+        rerank_device="mps",
+        max_concurrent_builds=4,
+        max_inflight_embeddings=4,
+        embed_batch_size=32,
+        max_concurrent_embed_batches=4,
+        max_concurrent_summaries=4,
+        qa_device="mps",
+        qa_threshold=0.5,
+    ):
         # Model setup with Llama 3
+        self.model = model
         Settings.llm = Ollama(model=model, request_timeout=60.0)
         # Each chunk is a node
         # Chunk size by default is 1024 and chunk overlap by default is 20
         Settings.node_parser = SentenceSplitter()
-        # Use Nomic embedding
-        Settings.embed_model = OllamaEmbedding(model_name=embedding)
+        # Use Nomic embedding, several chunks per request
+        Settings.embed_model = BatchedOllamaEmbedding(
+            model_name=embedding,
+            batch_size=embed_batch_size,
+            max_concurrent_batches=max_concurrent_embed_batches,
+        )
+        # Vectors of another model or endpoint can't be searched together, the
+        # indexes are rebuilt when the embedding changes
+        self.embedding_signature = {
+            "model": embedding,
+            "endpoint": Settings.embed_model.base_url + EMBED_ENDPOINT,
+        }
+        self.summarizer = MapReduceSummarizer(
+            Settings.llm, max_concurrency=max_concurrent_summaries
+        )
+        self.summary_cache = SummaryCache(SUMMARY_CACHE_LOCAL)
+        # Factual questions are answered from a span of the note when the
+        # extractive model is confident enough, before asking the LLM
+        self.extractive_qa = ExtractiveQA(device=qa_device, threshold=qa_threshold)
         self.response_synthesizer = get_response_synthesizer(
             response_mode=ResponseMode.COMPACT, use_async=True
         )
+        # Answers of the streamed search, synthesized from retrieved nodes
+        self.streaming_synthesizer = get_response_synthesizer(
+            response_mode=ResponseMode.COMPACT, use_async=True, streaming=True
+        )
         self.db_reader = FirebaseFirestoreReader(
             FIREBASE_DB_URL, FIREBASE_SERVICE_KEY_PATH
         )
+        # One Chroma client is shared by the whole process
+        self.vector_db = None
+        # LRU of the search indexes of the most recently active users
+        self.search_indexes = OrderedDict()
+        self.max_cached_indexes = max_cached_indexes
+        # LRU of the indexes of single notes for summarization and QA, keyed by
+        # user and note ID along with the hash of the note content
+        self.document_indexes = OrderedDict()
+        self.max_cached_documents = max_cached_documents
+        # The indexes of several users are built at once on startup
+        self.index_scheduler = IndexBuildScheduler(
+            max_concurrent_builds, max_inflight_embeddings
+        )
+        self.index_lock = threading.Lock()
+        self.manifest_lock = threading.Lock()
+        self.client_lock = threading.Lock()
+        # The ColBERT reranker is loaded on the first search and then shared
+        self.rerank_device = rerank_device
+        self.colbert_scorer = None
+        self.colbert_store = ColbertEmbeddingStore(
+            COLBERT_DB_LOCAL, max_cached_colbert_bytes
+        )
+        manifest = self.load_manifest()
+        self.manifest = manifest or {}
         # Prepare firebase and vector db on initialization if necessary
         if init_db:
-            self.init_db_dirs()
-            self.load_search_db()
-            self.init_search_indexes()
+            # Everything is reindexed when the embedding changed
+            if incremental_sync and manifest is not None:
+                # Only reindex the notes changed since the last startup
+                self.sync_search_db()
+            else:
+                self.init_db_dirs()
+                remote_docs = self.load_search_db()
+                self.init_search_indexes(remote_docs)
 
     def __remove_html(self, html_text) -> str:
-        soup = BeautifulSoup(html_text, features="html.parser")
-        return soup.get_text()
-
-    async def summarize(self, html_text) -> str:
-        text = self.__remove_html(html_text)
-        docs = [Document(text=text)]
-        # index = DocumentSummaryIndex.from_documents(
-        #     docs,
-        #     response_synthesizer=self.response_synthesizer,
-        #     show_progress=True,
-        # )
-        # summary = index.get_document_summary(docs[0].doc_id)
-        # return summary
-        index = VectorStoreIndex(
-            docs,
-            response_synthesizer=self.response_synthesizer,
-            use_async=True,
-            show_progress=True,
-        )
-        query_engine = index.as_query_engine(streaming=True)
-        response = await query_engine.aquery("Summarize the document")
-        # Stream the response
-        return response.response_gen
+        return html_to_text(html_text)
 
-    async def answer_question(self, query, html_context):
-        context = self.__remove_html(html_context)
-        docs = [Document(text=context)]
-        index = VectorStoreIndex(
-            docs,
-            response_synthesizer=self.response_synthesizer,
-            use_async=True,
-            show_progress=True,
+    async def summarize(self, html_text, html=True, bypass_cache=False):
+        text = self.__remove_html(html_text) if html else html_text
+        key = self.summary_cache.key(text, self.model, PROMPT_VERSION)
+        if not bypass_cache:
+            summary = await asyncio.to_thread(self.summary_cache.get, key)
+            if summary is not None:
+                return self.__replay(summary)
+        # The whole note is summarized instead of the retrieved chunks only
+        stream = await self.summarizer.summarize(text)
+        return self.__cache_summary(key, stream)
+
+    async def __replay(self, text: str):
+        # Same interface as a generated answer for the streaming response
+        yield text
+
+    async def __cache_summary(self, key: str, stream):
+        deltas = []
+        # Closing the stream early stops the generation upstream
+        async with aclosing(stream):
+            async for delta in stream:
+                deltas.append(delta)
+                yield delta
+        # Only the summaries streamed to the end are stored
+        await asyncio.to_thread(self.summary_cache.put, key, "".join(deltas))
+
+    async def answer_question(
+        self, query, html_context, user_id=None, doc_id=None, html=True, tiered=True
+    ):
+        context = self.__remove_html(html_context) if html else html_context
+        if tiered:
+            answer = await asyncio.to_thread(self.extractive_qa.answer, query, context)
+            if answer is not None:
+                return self.__replay(answer)
+        # Embedding blocks so the index is built outside of the event loop
+        index = await asyncio.to_thread(
+            self.get_document_index, user_id, doc_id, context
         )
         # similarity_top_k is the number of nodes with top similarity, default is 1
         # similarity_cutoff is the least similarity required for a node to be chosen
@@ -83,8 +182,67 @@ class NLPEngine:
         # Stream the response
         return response.response_gen
 
+    def get_document_index(self, user_id, doc_id, text: str) -> VectorStoreIndex:
+        if user_id is None or doc_id is None:
+            return self.init_document_index(Document(text=text))
+        # An edited note has a new hash so its previous index is never reused
+        key = (user_id, doc_id)
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        with self.index_lock:
+            entry = self.document_indexes.get(key)
+            if entry is not None and entry[0] == content_hash:
+                self.document_indexes.move_to_end(key)
+                return entry[1]
+        doc = Document(id_=doc_id, text=text)
+        doc.embedding = self.load_stored_embedding(user_id, doc_id, text)
+        index = self.init_document_index(doc)
+        with self.index_lock:
+            self.document_indexes[key] = (content_hash, index)
+            self.document_indexes.move_to_end(key)
+            if len(self.document_indexes) > self.max_cached_documents:
+                self.document_indexes.popitem(last=False)
+        return index
+
+    def init_document_index(self, doc: Document) -> VectorStoreIndex:
+        if doc.embedding is None:
+            self.embed_documents([doc])
+        return VectorStoreIndex(
+            [doc],
+            response_synthesizer=self.response_synthesizer,
+            use_async=True,
+            show_progress=True,
+        )
+
+    def load_stored_embedding(self, user_id, doc_id, text: str) -> list[float]:
+        # The note is also a node of the user's search index, its vector is
+        # reused as long as the indexed text is the same
+        try:
+            collection = self.get_vector_db().get_collection(user_id)
+        except ValueError:
+            return None
+        stored = collection.get(ids=[doc_id], include=["documents", "embeddings"])
+        if len(stored["ids"]) == 0 or stored["documents"][0] != text:
+            return None
+        return [float(x) for x in stored["embeddings"][0]]
+
+    def invalidate_document_indexes(self, user_id: str, doc_ids=None):
+        with self.index_lock:
+            for key in list(self.document_indexes):
+                if key[0] == user_id and (doc_ids is None or key[1] in doc_ids):
+                    del self.document_indexes[key]
+
     ############################### LLM search ####################################
     def init_db_dirs(self):
+        # The handles point into the folders about to be overwritten
+        self.vector_db = None
+        with self.index_lock:
+            self.search_indexes.clear()
+            self.document_indexes.clear()
+        self.colbert_store.clear()
+        with self.manifest_lock:
+            self.manifest = {}
+        if os.path.exists(SEARCH_MANIFEST_LOCAL):
+            os.remove(SEARCH_MANIFEST_LOCAL)
         # Create a root db folder
         os.makedirs("db", exist_ok=True)
         # Overwrite Firebase db folder
@@ -97,81 +255,302 @@ class NLPEngine:
         if vector_db.exists():
             shutil.rmtree(VECTOR_DB_LOCAL)
         os.makedirs(VECTOR_DB_LOCAL)
+        # Overwrite ColBERT embeddings folder
+        colbert_db = Path(COLBERT_DB_LOCAL)
+        if colbert_db.exists():
+            shutil.rmtree(COLBERT_DB_LOCAL)
+        os.makedirs(COLBERT_DB_LOCAL)
+
+    def load_search_db(self) -> dict[str, dict[str, str]]:
+        return self.db_reader.load_data(indexed=self.manifest)
+
+    def load_manifest(self) -> Optional[dict[str, dict[str, str]]]:
+        """Return the indexed notes by user, None if built with another embedding."""
+        if not os.path.exists(SEARCH_MANIFEST_LOCAL):
+            return {}
+        with open(SEARCH_MANIFEST_LOCAL, "r") as f:
+            manifest = json.load(f)
+        # Manifests written before the embedding was recorded are not trusted
+        if manifest.get("embedding") != self.embedding_signature:
+            return None
+        return manifest["users"]
+
+    def save_manifest(self):
+        os.makedirs("db", exist_ok=True)
+        # Write to a temporary file first so that a crash never leaves a
+        # truncated manifest behind
+        with open(f"{SEARCH_MANIFEST_LOCAL}.tmp", "w") as f:
+            json.dump(
+                {"embedding": self.embedding_signature, "users": self.manifest}, f
+            )
+        os.replace(f"{SEARCH_MANIFEST_LOCAL}.tmp", SEARCH_MANIFEST_LOCAL)
+
+    def update_manifest(self, user_id: str, docs: dict[str, str] = None):
+        # The indexes of several users may be built concurrently
+        with self.manifest_lock:
+            if docs is None:
+                self.manifest.pop(user_id, None)
+            else:
+                self.manifest[user_id] = dict(docs)
+            self.save_manifest()
+
+    def sync_search_db(self):
+        os.makedirs(FIREBASE_DB_LOCAL, exist_ok=True)
+        os.makedirs(VECTOR_DB_LOCAL, exist_ok=True)
+        os.makedirs(COLBERT_DB_LOCAL, exist_ok=True)
+        # Refresh the local copy of the notes and compare it to the manifest
+        remote_docs = self.load_search_db()
+        for user_id in list(self.manifest):
+            if user_id not in remote_docs:
+                self.remove_search_index(user_id)
+        self.index_scheduler.run(
+            list(remote_docs),
+            lambda user_id: self.sync_search_index(user_id, remote_docs[user_id]),
+            self.get_activity(remote_docs),
+        )
 
-    def load_search_db(self):
-        self.db_reader.load_data()
+    def sync_search_index(self, user_id: str, remote_docs: dict[str, str]):
+        user_dir = f"{FIREBASE_DB_LOCAL}/{user_id}"
+        # Remove the local copies of the deleted notes
+        for f in os.listdir(user_dir):
+            if f.split(".")[0] not in remote_docs:
+                os.remove(f"{user_dir}/{f}")
+
+        indexed_docs = self.manifest.get(user_id)
+        collection = self.get_vector_db().get_or_create_collection(user_id)
+        if indexed_docs is None or collection.count() != len(indexed_docs):
+            # Nodes without a manifest entry, such as the chunks written before
+            # the note ID became the node ID, can't be deleted by note ID, and
+            # a collection out of step with the manifest is never updated
+            self.rebuild_search_index(user_id)
+            return
+
+        changed = [
+            doc_id
+            for doc_id, last_modified in remote_docs.items()
+            if indexed_docs.get(doc_id) != last_modified
+        ]
+        removed = [doc_id for doc_id in indexed_docs if doc_id not in remote_docs]
+        if not changed and not removed:
+            return
+
+        # The note ID is the node ID so stale vectors are deleted by ID
+        index = self.load_search_index(user_id)
+        stale = changed + removed
+        self.invalidate_document_indexes(user_id, set(stale))
+        collection.delete(ids=stale)
+        docs = [self.load_note(f"{user_dir}/{doc_id}.json") for doc_id in changed]
+        if docs:
+            self.embed_documents(docs)
+            index.insert_nodes(docs)
+
+        embeddings = dict(self.colbert_store.load(user_id))
+        for doc_id in stale:
+            embeddings.pop(doc_id, None)
+        embeddings.update(self.encode_colbert_embeddings(docs))
+        self.colbert_store.save(user_id, embeddings)
+
+        self.update_manifest(user_id, remote_docs)
+
+    def rebuild_search_index(self, user_id: str) -> VectorStoreIndex:
+        # Drop the whole collection and index all the local notes again
+        self.invalidate_search_index(user_id)
+        self.invalidate_document_indexes(user_id)
+        try:
+            self.get_vector_db().delete_collection(user_id)
+        except ValueError:
+            pass
+        return self.init_search_index(user_id)
+
+    def remove_search_index(self, user_id: str):
+        # All the notes of the user were deleted
+        self.invalidate_search_index(user_id)
+        self.invalidate_document_indexes(user_id)
+        try:
+            self.get_vector_db().delete_collection(user_id)
+        except ValueError:
+            pass
+        self.colbert_store.delete(user_id)
+        user_dir = Path(f"{FIREBASE_DB_LOCAL}/{user_id}")
+        if user_dir.exists():
+            shutil.rmtree(user_dir)
+        self.update_manifest(user_id, None)
+
+    def get_vector_db(self):
+        # initialize client once, setting path to save data
+        with self.client_lock:
+            if self.vector_db is None:
+                self.vector_db = chromadb.PersistentClient(path=VECTOR_DB_LOCAL)
+        return self.vector_db
 
     def init_storage_context(
         self, collection_name: str
     ) -> tuple[ChromaVectorStore, StorageContext]:
-        # initialize client, setting path to save data
-        vector_db = chromadb.PersistentClient(path=VECTOR_DB_LOCAL)
         # create  or get collection
-        collection = vector_db.get_or_create_collection(collection_name)
+        collection = self.get_vector_db().get_or_create_collection(collection_name)
         # assign chroma as the vector_store to the context
         vector_store = ChromaVectorStore(chroma_collection=collection)
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
         return vector_store, storage_context
 
-    def init_search_indexes(self):
+    def get_activity(self, remote_docs: dict[str, dict[str, str]]) -> dict[str, str]:
+        # Latest modification time of the notes of every user, ISO formatted
+        return {
+            user_id: max(docs.values(), default="")
+            for user_id, docs in remote_docs.items()
+        }
+
+    def init_search_indexes(self, remote_docs: dict[str, dict[str, str]] = None):
         user_dirs = os.listdir(FIREBASE_DB_LOCAL)
-        for f in user_dirs:
-            self.init_search_index(f)
+        activity = self.get_activity(remote_docs) if remote_docs else None
+        self.index_scheduler.run(user_dirs, self.init_search_index, activity)
+
+    def load_note(self, path: str) -> Document:
+        with open(path, "r") as f:
+            note = json.load(f)
+        # Only the content is embedded, the note fields are kept as metadata to
+        # be returned with the search results and the title is shown to the LLM
+        return Document(
+            id_=note["id"],
+            text=note["content"],
+            metadata={k: note[k] for k in SOURCE_KEYS},
+            excluded_embed_metadata_keys=SOURCE_KEYS,
+            excluded_llm_metadata_keys=[k for k in SOURCE_KEYS if k != "title"],
+        )
 
     def init_search_index(self, user_id) -> VectorStoreIndex:
-        json_reader = JSONReader()
         user_dir = os.listdir(f"{FIREBASE_DB_LOCAL}/{user_id}")
         docs = []
         for f in user_dir:
-            # Append documents and provide the document ID as the citation source
-            docs += json_reader.load_data(
-                f"{FIREBASE_DB_LOCAL}/{user_id}/{f}",
-                extra_info={"source": f.split(".")[0]},
-            )
+            docs.append(self.load_note(f"{FIREBASE_DB_LOCAL}/{user_id}/{f}"))
+        # Embed under the global cap of in-flight embedding requests
+        self.embed_documents(docs)
         # Use user ID as the collection name
         _, storage_context = self.init_storage_context(user_id)
-        return VectorStoreIndex(
+        index = VectorStoreIndex(
             docs,
             storage_context=storage_context,
             response_synthesizer=self.response_synthesizer,
             use_async=True,
             show_progress=True,
         )
+        # Replace the handle of the previous ingestion of the user's notes
+        self.cache_search_index(user_id, index)
+        self.colbert_store.save(user_id, self.encode_colbert_embeddings(docs))
+        # Record what was indexed for the incremental sync
+        self.update_manifest(
+            user_id, {doc.node_id: doc.metadata["lastModified"] for doc in docs}
+        )
+        return index
+
+    def embed_documents(self, docs: list[Document]):
+        # Documents with an embedding are not embedded again by the index
+        texts = [doc.get_content(metadata_mode=MetadataMode.EMBED) for doc in docs]
+        for doc, embedding in zip(docs, self.index_scheduler.embed_texts(texts)):
+            doc.embedding = embedding
+
+    def encode_colbert_embeddings(self, docs: list[Document]) -> dict:
+        # Precompute the ColBERT token embeddings of every document so that
+        # reranking only has to encode the query
+        if not docs:
+            return {}
+        texts = [doc.get_content(metadata_mode=MetadataMode.EMBED) for doc in docs]
+        embeddings = self.get_colbert_scorer().encode_documents(texts)
+        return {doc.node_id: e for doc, e in zip(docs, embeddings)}
+
+    def cache_search_index(self, user_id: str, index: VectorStoreIndex):
+        with self.index_lock:
+            self.search_indexes[user_id] = index
+            self.search_indexes.move_to_end(user_id)
+            if len(self.search_indexes) > self.max_cached_indexes:
+                self.search_indexes.popitem(last=False)
+
+    def invalidate_search_index(self, user_id: str):
+        with self.index_lock:
+            self.search_indexes.pop(user_id, None)
+        self.colbert_store.invalidate(user_id)
 
     def load_search_index(self, user_id: str) -> VectorStoreIndex:
+        with self.index_lock:
+            index = self.search_indexes.get(user_id)
+            if index is not None:
+                self.search_indexes.move_to_end(user_id)
+                return index
         vector_store, storage_context = self.init_storage_context(user_id)
-        return VectorStoreIndex.from_vector_store(
+        index = VectorStoreIndex.from_vector_store(
             vector_store,
             storage_context=storage_context,
             response_synthesizer=self.response_synthesizer,
             show_progress=True,
         )
+        self.cache_search_index(user_id, index)
+        return index
 
-    async def search(
-        self, user_id: str, query: str, sim_top_k=20, top_n=1
-    ) -> list[dict]:
-        index = self.load_search_index(user_id)
-        # create a reranker
-        reranker = ColbertRerank(
+    def get_colbert_scorer(self) -> ColbertScorer:
+        with self.client_lock:
+            if self.colbert_scorer is None:
+                self.colbert_scorer = ColbertScorer(
+                    model="colbert-ir/colbertv2.0",
+                    tokenizer="colbert-ir/colbertv2.0",
+                    device=self.rerank_device,
+                )
+        return self.colbert_scorer
+
+    def get_reranker(self, user_id: str, top_n: int) -> SharedColbertRerank:
+        # create a reranker over the shared ColBERT model
+        return SharedColbertRerank(
+            self.get_colbert_scorer(),
             top_n=top_n,
-            model="colbert-ir/colbertv2.0",
-            tokenizer="colbert-ir/colbertv2.0",
-            device="mps",
             keep_retrieval_score=True,
+            embeddings=self.colbert_store.load(user_id),
         )
-        # create a query engine and query
-        query_engine = index.as_query_engine(
-            similarity_top_k=sim_top_k, node_postprocessors=[reranker]
-        )
-        response = await query_engine.aquery(
-            f"{query}. Please only use the retrieved document as the primary source."
+
+    def get_sources(self, nodes) -> list[dict]:
+        # The note fields are read back from the node metadata
+        return [{k: node.metadata[k] for k in SOURCE_KEYS} for node in nodes]
+
+    async def search(
+        self, user_id: str, query: str, sim_top_k=20, top_n=1
+    ) -> list[dict]:
+        nodes = await self.retrieve_nodes(user_id, query, sim_top_k, top_n)
+        response = await self.response_synthesizer.asynthesize(
+            f"{query}. Please only use the retrieved document as the primary source.",
+            nodes,
         )
-        nodes = response.source_nodes
-        src = []
-        for i in range(len(nodes)):
-            # Turn text into dictionary and append to results
-            text = nodes[i].text
-            text = text[: text.find(',\n"content"')]
-            src.append(json.loads(f"{{{text}}}"))
+        src = self.get_sources(response.source_nodes)
         # TODO: Filter the results
         return str(response), src
+
+    async def search_stream(self, user_id: str, query: str, sim_top_k=20, top_n=1):
+        # The sources are returned as soon as they are retrieved, the answer is
+        # only generated once its stream is consumed
+        nodes = await self.retrieve_nodes(user_id, query, sim_top_k, top_n)
+        return self.get_sources(nodes), self.__synthesize_stream(query, nodes)
+
+    async def __synthesize_stream(self, query: str, nodes):
+        response = await self.streaming_synthesizer.asynthesize(
+            f"{query}. Please only use the retrieved document as the primary source.",
+            nodes,
+        )
+        async with aclosing(aiter_tokens(response.response_gen)) as tokens:
+            async for token in tokens:
+                yield token
+
+    async def retrieve_nodes(self, user_id: str, query: str, sim_top_k, top_n):
+        index = self.load_search_index(user_id)
+        retriever = index.as_retriever(similarity_top_k=sim_top_k)
+        nodes = await retriever.aretrieve(query)
+        # Loading the ColBERT embeddings and scoring block so they run outside
+        # of the event loop
+        return await asyncio.to_thread(self.rerank, user_id, query, nodes, top_n)
+
+    def rerank(self, user_id: str, query: str, nodes, top_n: int):
+        reranker = self.get_reranker(user_id, top_n)
+        return reranker.postprocess_nodes(nodes, query_str=query)
+
+    async def retrieve(
+        self, user_id: str, query: str, sim_top_k=20, top_n=5
+    ) -> list[dict]:
+        # Retrieve and rerank the sources only, without synthesizing an answer
+        nodes = await self.retrieve_nodes(user_id, query, sim_top_k, top_n)
+        return self.get_sources(nodes)
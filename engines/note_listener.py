@@ -0,0 +1,101 @@
+from typing import TYPE_CHECKING
+import asyncio
+import time
+
+from firebase.firebase_reader import write_note
+
+if TYPE_CHECKING:
+    from engines.nlp_engine import NLPEngine
+
+
+class NoteChangeListener:
+    def __init__(
+        self, nlp_engine: "NLPEngine", collection, debounce=2.0, max_delay=30.0
+    ):
+        self.nlp_engine = nlp_engine
+        # Firestore collection or any object with the same on_snapshot interface
+        self.collection = collection
+        # Changes are applied once no new change arrived for debounce seconds,
+        # or max_delay seconds after the first one under continuous editing
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.loop = None
+        self.queue = None
+        self.task = None
+        self.watch = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.task = loop.create_task(self.__run())
+        self.watch = self.collection.on_snapshot(self.__on_snapshot)
+
+    def stop(self):
+        if self.watch is not None:
+            self.watch.unsubscribe()
+        if self.task is not None:
+            self.task.cancel()
+
+    def __on_snapshot(self, snapshot, changes, read_time):
+        # Called on the Firestore listener thread, hand the events to the loop
+        for change in changes:
+            event = (change.type.name, change.document.id, change.document.to_dict())
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def __next_batch(self) -> dict:
+        # Later events of a note replace the earlier ones so that a burst of
+        # edits results in a single re-embed
+        change_type, doc_id, doc_dict = await self.queue.get()
+        batch = {doc_id: (change_type, doc_dict)}
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            timeout = min(self.debounce, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                change_type, doc_id, doc_dict = await asyncio.wait_for(
+                    self.queue.get(), timeout
+                )
+            except asyncio.TimeoutError:
+                break
+            batch[doc_id] = (change_type, doc_dict)
+        return batch
+
+    async def __run(self):
+        while True:
+            batch = await self.__next_batch()
+            try:
+                # Embedding blocks so it runs outside of the event loop
+                await asyncio.to_thread(self.apply, batch)
+            except Exception as e:
+                print(f"Failed to apply note changes: {e}")
+
+    def apply(self, batch: dict):
+        manifest = self.nlp_engine.manifest
+        remote_docs = {}
+        for doc_id, (change_type, doc_dict) in batch.items():
+            if change_type == "REMOVED":
+                # Find the owner of the note from what was indexed
+                user_id = next(
+                    (u for u, docs in manifest.items() if doc_id in docs), None
+                )
+                if user_id is None:
+                    continue
+                docs = remote_docs.setdefault(user_id, dict(manifest[user_id]))
+                docs.pop(doc_id, None)
+            else:
+                # The first snapshot reports every note as added, skip the ones
+                # already indexed by the startup sync
+                user_id = doc_dict["userId"]
+                last_modified = doc_dict["lastModified"].isoformat()
+                if manifest.get(user_id, {}).get(doc_id) == last_modified:
+                    continue
+                user_id, last_modified = write_note(doc_id, doc_dict)
+                docs = remote_docs.setdefault(user_id, dict(manifest.get(user_id, {})))
+                docs[doc_id] = last_modified
+        # Reuse the incremental sync for every affected user
+        for user_id, docs in remote_docs.items():
+            if docs:
+                self.nlp_engine.sync_search_index(user_id, docs)
+            else:
+                self.nlp_engine.remove_search_index(user_id)
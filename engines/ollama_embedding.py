@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import asyncio
+import random
+import time
+
+import httpx
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+# Overloaded or restarting backend, the request is worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Batched embedding endpoint of the Ollama API
+EMBED_ENDPOINT = "/api/embed"
+
+
+class BatchedOllamaEmbedding(BaseEmbedding):
+    """Ollama embeddings requested in batches over a pooled HTTP client."""
+
+    base_url: str = Field(
+        default="http://localhost:11434", description="Base URL of the Ollama server."
+    )
+    batch_size: int = Field(default=32, gt=0, description="Texts per request.")
+    max_concurrent_batches: int = Field(
+        default=4, gt=0, description="Requests in flight at the same time."
+    )
+    max_retries: int = Field(default=3, ge=0, description="Retries per request.")
+    backoff: float = Field(
+        default=0.5, ge=0, description="Delay in seconds before the first retry."
+    )
+    request_timeout: float = Field(default=60.0, description="Timeout in seconds.")
+    _client: httpx.Client = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: str,
+        base_url: str = "http://localhost:11434",
+        batch_size: int = 32,
+        max_concurrent_batches: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        request_timeout: float = 60.0,
+        **kwargs,
+    ):
+        # The index hands over enough texts at once to fill all the batches
+        super().__init__(
+            model_name=model_name,
+            base_url=base_url,
+            batch_size=batch_size,
+            max_concurrent_batches=max_concurrent_batches,
+            max_retries=max_retries,
+            backoff=backoff,
+            request_timeout=request_timeout,
+            embed_batch_size=batch_size * max_concurrent_batches,
+            **kwargs,
+        )
+        # The connections are kept alive and shared by all the callers, the
+        # pool size caps the requests in flight across the whole process
+        self._client = httpx.Client(
+            base_url=base_url,
+            timeout=request_timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrent_batches,
+                max_keepalive_connections=max_concurrent_batches,
+            ),
+        )
+        self._executor = ThreadPoolExecutor(max_concurrent_batches)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedOllamaEmbedding"
+
+    def _embed_batch(self, texts: List[str]) -> List[Embedding]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._client.post(
+                    EMBED_ENDPOINT, json={"model": self.model_name, "input": texts}
+                )
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            except httpx.HTTPStatusError as e:
+                retryable = e.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt == self.max_retries:
+                    raise
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            # Exponential backoff with jitter so that the retries of the
+            # concurrent batches do not hit the server at the same time
+            time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        embeddings = []
+        for batch_embeddings in self._executor.map(self._embed_batch, batches):
+            embeddings += batch_embeddings
+        return embeddings
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_batch([text])[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed_batch([query])[0]
+
+    # The async variants reuse the pooled client from a worker thread since
+    # the indexes run their async calls on short-lived event loops
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.to_thread(self._get_query_embedding, query)
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import mlx.core as mx
+
+
+class ConditioningCache:
+    """A LRU cache of text conditioning tensors bounded by their size in bytes."""
+
+    def __init__(self, max_bytes: int = 128 * 1024**2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[mx.array, ...]]:
+        arrays = self._entries.get(key)
+        if arrays is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return arrays
+
+    def put(self, key: str, arrays: Tuple[mx.array, ...]):
+        nbytes = sum(a.nbytes for a in arrays)
+        if nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= sum(a.nbytes for a in self._entries.pop(key))
+        self._entries[key] = arrays
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in evicted)
@@ -1,11 +1,13 @@
 # Copyright © 2023-2024 Apple Inc.
 
 import json
-from typing import Optional
+import os
+from typing import Optional, Tuple
 
 import mlx.core as mx
+import mlx.nn as nn
 from huggingface_hub import hf_hub_download
-from mlx.utils import tree_unflatten
+from mlx.utils import tree_flatten, tree_unflatten
 
 from .clip import CLIPTextModel
 from .config import AutoencoderConfig, CLIPTextModelConfig, DiffusionConfig, UNetConfig
@@ -175,6 +177,77 @@ def _load_safetensor_weights(mapper, model, weight_file, float16: bool = False):
     model.update(tree_unflatten(weights))
 
 
+def _linear_only(_, module):
+    return isinstance(module, nn.Linear)
+
+
+def _quantize(model, quantization: Tuple[int, int], class_predicate=None):
+    group_size, bits = quantization
+    nn.quantize(
+        model, group_size=group_size, bits=bits, class_predicate=class_predicate
+    )
+
+
+def _cache_file(
+    cache_dir: str,
+    key: str,
+    model_key: str,
+    float16: bool,
+    quantization: Optional[Tuple[int, int]],
+):
+    """Path of the converted weights of one model component in the cache."""
+    dtype = "float16" if float16 else "float32"
+    if quantization is None:
+        quant = "unquantized"
+    else:
+        group_size, bits = quantization
+        quant = f"q{bits}-g{group_size}"
+    model_dir = os.path.join(cache_dir, key.replace("/", "--"))
+    return os.path.join(model_dir, f"{model_key}-{dtype}-{quant}.safetensors")
+
+
+def _load_weights(
+    mapper,
+    model,
+    key: str,
+    model_key: str,
+    float16: bool = False,
+    quantization: Optional[Tuple[int, int]] = None,
+    class_predicate=None,
+    cache_dir: Optional[str] = None,
+):
+    """Load the weights of a model component, converting them if needed.
+
+    Without a cache directory the Hugging Face weights are mapped (and
+    optionally quantized) on every call. With a cache directory the converted
+    weights are written once and later loads read them back directly.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = _cache_file(cache_dir, key, model_key, float16, quantization)
+        if os.path.exists(cache_file):
+            # Only the module structure is quantized here, the lazily computed
+            # quantized parameters are replaced by the cached ones before they
+            # are ever evaluated
+            if quantization is not None:
+                _quantize(model, quantization, class_predicate)
+            model.load_weights(cache_file)
+            return
+
+    weight_file = hf_hub_download(key, _MODELS[key][model_key])
+    _load_safetensor_weights(mapper, model, weight_file, float16)
+    if quantization is not None:
+        _quantize(model, quantization, class_predicate)
+
+    if cache_file is not None:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Write to a temporary file first so that an interrupted conversion
+        # never leaves a truncated file in the cache
+        tmp_file = cache_file.replace(".safetensors", ".tmp.safetensors")
+        mx.save_safetensors(tmp_file, dict(tree_flatten(model.parameters())))
+        os.replace(tmp_file, cache_file)
+
+
 def _check_key(key: str, part: str):
     if key not in _MODELS:
         raise ValueError(
@@ -182,8 +255,17 @@ def _check_key(key: str, part: str):
         )
 
 
-def load_unet(key: str = _DEFAULT_MODEL, float16: bool = False):
-    """Load the stable diffusion UNet from Hugging Face Hub."""
+def load_unet(
+    key: str = _DEFAULT_MODEL,
+    float16: bool = False,
+    quantization: Optional[Tuple[int, int]] = None,
+    cache_dir: Optional[str] = None,
+):
+    """Load the stable diffusion UNet from Hugging Face Hub.
+
+    ``quantization`` is an optional ``(group_size, bits)`` pair and
+    ``cache_dir`` an optional directory for the converted weights.
+    """
     _check_key(key, "load_unet")
 
     # Download the config and create the model
@@ -219,9 +301,15 @@ def load_unet(key: str = _DEFAULT_MODEL, float16: bool = False):
     )
 
     # Download the weights and map them into the model
-    unet_weights = _MODELS[key]["unet"]
-    weight_file = hf_hub_download(key, unet_weights)
-    _load_safetensor_weights(map_unet_weights, model, weight_file, float16)
+    _load_weights(
+        map_unet_weights,
+        model,
+        key,
+        "unet",
+        float16,
+        quantization=quantization,
+        cache_dir=cache_dir,
+    )
 
     return model
 
@@ -231,8 +319,13 @@ def load_text_encoder(
     float16: bool = False,
     model_key: str = "text_encoder",
     config_key: Optional[str] = None,
+    quantization: Optional[Tuple[int, int]] = None,
+    cache_dir: Optional[str] = None,
 ):
-    """Load the stable diffusion text encoder from Hugging Face Hub."""
+    """Load the stable diffusion text encoder from Hugging Face Hub.
+
+    Only the linear layers are quantized when ``quantization`` is given.
+    """
     _check_key(key, "load_text_encoder")
 
     config_key = config_key or (model_key + "_config")
@@ -257,14 +350,23 @@ def load_text_encoder(
     )
 
     # Download the weights and map them into the model
-    text_encoder_weights = _MODELS[key][model_key]
-    weight_file = hf_hub_download(key, text_encoder_weights)
-    _load_safetensor_weights(map_clip_text_encoder_weights, model, weight_file, float16)
+    _load_weights(
+        map_clip_text_encoder_weights,
+        model,
+        key,
+        model_key,
+        float16,
+        quantization=quantization,
+        class_predicate=_linear_only,
+        cache_dir=cache_dir,
+    )
 
     return model
 
 
-def load_autoencoder(key: str = _DEFAULT_MODEL, float16: bool = False):
+def load_autoencoder(
+    key: str = _DEFAULT_MODEL, float16: bool = False, cache_dir: Optional[str] = None
+):
     """Load the stable diffusion autoencoder from Hugging Face Hub."""
     _check_key(key, "load_autoencoder")
 
@@ -287,9 +389,7 @@ def load_autoencoder(key: str = _DEFAULT_MODEL, float16: bool = False):
     )
 
     # Download the weights and map them into the model
-    vae_weights = _MODELS[key]["vae"]
-    weight_file = hf_hub_download(key, vae_weights)
-    _load_safetensor_weights(map_vae_weights, model, weight_file, float16)
+    _load_weights(map_vae_weights, model, key, "vae", float16, cache_dir=cache_dir)
 
     return model
 
@@ -328,3 +428,26 @@ def load_tokenizer(
     bpe_ranks = dict(map(reversed, enumerate(bpe_merges)))
 
     return Tokenizer(bpe_ranks, vocab)
+
+
+def convert_weights(
+    key: str,
+    cache_dir: str,
+    float16: bool = False,
+    unet_quantization: Optional[Tuple[int, int]] = None,
+    text_encoder_quantization: Optional[Tuple[int, int]] = None,
+):
+    """Write the mapped and quantized weights of every component to the cache."""
+    _check_key(key, "convert_weights")
+
+    load_unet(key, float16, quantization=unet_quantization, cache_dir=cache_dir)
+    for model_key in ("text_encoder", "text_encoder_2"):
+        if model_key in _MODELS[key]:
+            load_text_encoder(
+                key,
+                float16,
+                model_key=model_key,
+                quantization=text_encoder_quantization,
+                cache_dir=cache_dir,
+            )
+    load_autoencoder(key, False, cache_dir=cache_dir)
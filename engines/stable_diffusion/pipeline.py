@@ -1,10 +1,11 @@
 # Copyright © 2023-2024 Apple Inc.
 
 import time
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 import mlx.core as mx
 
+from .conditioning_cache import ConditioningCache
 from .model_io import (
     _DEFAULT_MODEL,
     load_autoencoder,
@@ -17,12 +18,29 @@ from .sampler import SimpleEulerAncestralSampler, SimpleEulerSampler
 
 
 class StableDiffusion:
-    def __init__(self, model: str = _DEFAULT_MODEL, float16: bool = False):
+    def __init__(
+        self,
+        model: str = _DEFAULT_MODEL,
+        float16: bool = False,
+        cache_dir: Optional[str] = None,
+        unet_quantization: Optional[Tuple[int, int]] = None,
+        text_encoder_quantization: Optional[Tuple[int, int]] = None,
+    ):
         self.dtype = mx.float16 if float16 else mx.float32
         self.diffusion_config = load_diffusion_config(model)
-        self.unet = load_unet(model, float16)
-        self.text_encoder = load_text_encoder(model, float16)
-        self.autoencoder = load_autoencoder(model, False)
+        self.unet = load_unet(
+            model, float16, quantization=unet_quantization, cache_dir=cache_dir
+        )
+        self.text_encoder = load_text_encoder(
+            model,
+            float16,
+            quantization=text_encoder_quantization,
+            cache_dir=cache_dir,
+        )
+        self.autoencoder = load_autoencoder(model, False, cache_dir=cache_dir)
+        # Kept on the pipeline so that latents can be sampled while the
+        # autoencoder is offloaded
+        self.latent_channels = self.autoencoder.latent_channels
         self.sampler = SimpleEulerSampler(self.diffusion_config)
         self.tokenizer = load_tokenizer(model)
 
@@ -31,21 +49,25 @@ class StableDiffusion:
         mx.eval(self.text_encoder.parameters())
         mx.eval(self.autoencoder.parameters())
 
-    def _tokenize(self, tokenizer, text: str, negative_text: Optional[str] = None):
-        # Tokenize the text
-        tokens = [tokenizer.tokenize(text)]
+    def _tokenize(
+        self,
+        tokenizer,
+        text: Union[str, List[str]],
+        negative_text: Optional[str] = None,
+        max_length: Optional[int] = None,
+    ):
+        # Tokenize the text, a list of prompts is tokenized as a single batch
+        # followed by one negative prompt per prompt
+        texts = [text] if isinstance(text, str) else list(text)
         if negative_text is not None:
-            tokens += [tokenizer.tokenize(negative_text)]
-        lengths = [len(t) for t in tokens]
-        N = max(lengths)
-        tokens = [t + [0] * (N - len(t)) for t in tokens]
-        tokens = mx.array(tokens)
+            texts += [negative_text] * len(texts)
+        tokens = tokenizer.tokenize_batch(texts, max_length)
 
         return tokens
 
     def _get_text_conditioning(
         self,
-        text: str,
+        text: Union[str, List[str]],
         n_images: int = 1,
         cfg_weight: float = 7.5,
         negative_text: str = "",
@@ -65,7 +87,14 @@ class StableDiffusion:
         return conditioning
 
     def _denoising_step(
-        self, x_t, t, t_prev, conditioning, cfg_weight: float = 7.5, text_time=None
+        self,
+        x_t,
+        t,
+        t_prev,
+        conditioning,
+        cfg_weight: float = 7.5,
+        text_time=None,
+        keys=None,
     ):
         x_t_unet = mx.concatenate([x_t] * 2, axis=0) if cfg_weight > 1 else x_t
         t_unet = mx.broadcast_to(t, [len(x_t_unet)])
@@ -77,7 +106,7 @@ class StableDiffusion:
             eps_text, eps_neg = eps_pred.split(2)
             eps_pred = eps_neg + cfg_weight * (eps_text - eps_neg)
 
-        x_t_prev = self.sampler.step(eps_pred, x_t, t, t_prev)
+        x_t_prev = self.sampler.step(eps_pred, x_t, t, t_prev, keys)
 
         return x_t_prev
 
@@ -89,19 +118,26 @@ class StableDiffusion:
         num_steps: int = 50,
         cfg_weight: float = 7.5,
         text_time=None,
+        keys=None,
     ):
         x_t = x_T
+        step_keys = None
         for t, t_prev in self.sampler.timesteps(
             num_steps, start_time=T, dtype=self.dtype
         ):
+            if keys is not None:
+                # Advance the PRNG key of every sample for this step
+                splits = [mx.random.split(k) for k in keys]
+                keys = [k[0] for k in splits]
+                step_keys = [k[1] for k in splits]
             x_t = self._denoising_step(
-                x_t, t, t_prev, conditioning, cfg_weight, text_time
+                x_t, t, t_prev, conditioning, cfg_weight, text_time, step_keys
             )
             yield x_t
 
     def generate_latents(
         self,
-        text: str,
+        text: Union[str, List[str]],
         n_images: int = 1,
         num_steps: int = 50,
         cfg_weight: float = 7.5,
@@ -118,9 +154,11 @@ class StableDiffusion:
             text, n_images, cfg_weight, negative_text
         )
 
-        # Create the latent variables
+        # Create the latent variables, n_images for every prompt
+        n_prompts = 1 if isinstance(text, str) else len(text)
         x_T = self.sampler.sample_prior(
-            (n_images, *latent_size, self.autoencoder.latent_channels), dtype=self.dtype
+            (n_prompts * n_images, *latent_size, self.latent_channels),
+            dtype=self.dtype,
         )
 
         # Perform the denoising loop
@@ -170,8 +208,21 @@ class StableDiffusion:
 
 
 class StableDiffusionXL(StableDiffusion):
-    def __init__(self, model: str = _DEFAULT_MODEL, float16: bool = False):
-        super().__init__(model, float16)
+    def __init__(
+        self,
+        model: str = _DEFAULT_MODEL,
+        float16: bool = False,
+        cache_dir: Optional[str] = None,
+        unet_quantization: Optional[Tuple[int, int]] = None,
+        text_encoder_quantization: Optional[Tuple[int, int]] = None,
+        conditioning_cache_bytes: int = 128 * 1024**2,
+    ):
+        super().__init__(
+            model, float16, cache_dir, unet_quantization, text_encoder_quantization
+        )
+
+        # Text conditioning of recent prompts keyed by the normalized prompt
+        self.conditioning_cache = ConditioningCache(conditioning_cache_bytes)
 
         self.sampler = SimpleEulerAncestralSampler(self.diffusion_config)
 
@@ -183,6 +234,8 @@ class StableDiffusionXL(StableDiffusion):
             model,
             float16,
             model_key="text_encoder_2",
+            quantization=text_encoder_quantization,
+            cache_dir=cache_dir,
         )
         self.tokenizer_2 = load_tokenizer(
             model,
@@ -196,31 +249,69 @@ class StableDiffusionXL(StableDiffusion):
         mx.eval(self.text_encoder_2.parameters())
         mx.eval(self.autoencoder.parameters())
 
+    def _conditioning_prompts(
+        self, text: Union[str, List[str]], cfg_weight: float, negative_text: str
+    ):
+        # The tokenizer lower cases and collapses whitespace so prompts that only
+        # differ in those share their conditioning
+        texts = [text] if isinstance(text, str) else list(text)
+        if cfg_weight > 1:
+            texts += [negative_text] * len(texts)
+        return [" ".join(t.lower().split()) for t in texts]
+
+    def is_conditioning_cached(
+        self,
+        text: Union[str, List[str]],
+        cfg_weight: float = 7.5,
+        negative_text: str = "",
+    ):
+        prompts = self._conditioning_prompts(text, cfg_weight, negative_text)
+        return all(p in self.conditioning_cache for p in prompts)
+
     def _get_text_conditioning(
         self,
-        text: str,
+        text: Union[str, List[str]],
         n_images: int = 1,
         cfg_weight: float = 7.5,
         negative_text: str = "",
     ):
-        tokens_1 = self._tokenize(
-            self.tokenizer_1,
-            text,
-            (negative_text if cfg_weight > 1 else None),
-        )
-        tokens_2 = self._tokenize(
-            self.tokenizer_2,
-            text,
-            (negative_text if cfg_weight > 1 else None),
-        )
+        prompts = self._conditioning_prompts(text, cfg_weight, negative_text)
+        entries = {p: self.conditioning_cache.get(p) for p in dict.fromkeys(prompts)}
+        missing = [p for p, entry in entries.items() if entry is None]
+
+        # Only run the text encoders on the prompts missing from the cache. They
+        # are padded to the full encoder length so that the conditioning of a
+        # prompt does not depend on the other prompts of the batch.
+        if missing:
+            tokens_1 = self._tokenize(
+                self.tokenizer_1,
+                missing,
+                max_length=self.text_encoder_1.position_embedding.weight.shape[0],
+            )
+            tokens_2 = self._tokenize(
+                self.tokenizer_2,
+                missing,
+                max_length=self.text_encoder_2.position_embedding.weight.shape[0],
+            )
 
-        conditioning_1 = self.text_encoder_1(tokens_1)
-        conditioning_2 = self.text_encoder_2(tokens_2)
-        conditioning = mx.concatenate(
-            [conditioning_1.hidden_states[-2], conditioning_2.hidden_states[-2]],
-            axis=-1,
-        )
-        pooled_conditioning = conditioning_2.pooled_output
+            conditioning_1 = self.text_encoder_1(tokens_1)
+            conditioning_2 = self.text_encoder_2(tokens_2)
+            conditioning = mx.concatenate(
+                [conditioning_1.hidden_states[-2], conditioning_2.hidden_states[-2]],
+                axis=-1,
+            )
+            pooled_conditioning = conditioning_2.pooled_output
+
+            for i, p in enumerate(missing):
+                entries[p] = (
+                    conditioning[i : i + 1],
+                    pooled_conditioning[i : i + 1],
+                )
+                mx.eval(entries[p])
+                self.conditioning_cache.put(p, entries[p])
+
+        conditioning = mx.concatenate([entries[p][0] for p in prompts], axis=0)
+        pooled_conditioning = mx.concatenate([entries[p][1] for p in prompts], axis=0)
 
         if n_images > 1:
             conditioning = mx.repeat(conditioning, n_images, axis=0)
@@ -230,17 +321,22 @@ class StableDiffusionXL(StableDiffusion):
 
     def generate_latents(
         self,
-        text: str,
+        text: Union[str, List[str]],
         n_images: int = 1,
         num_steps: int = 2,
         cfg_weight: float = 0.0,
         negative_text: str = "",
         latent_size: Tuple[int] = (64, 64),
-        seed=None,
+        seed: Union[None, int, List[int]] = None,
     ):
-        # Set the PRNG state
-        seed = int(time.time()) if seed is None else seed
-        mx.random.seed(seed)
+        # Set the PRNG state, a list holds one seed per generated image which
+        # makes every image independent of the others in the batch
+        keys = None
+        if isinstance(seed, list):
+            keys = [mx.random.key(s) for s in seed]
+        else:
+            seed = int(time.time()) if seed is None else seed
+            mx.random.seed(seed)
 
         # Get the text conditioning
         conditioning, pooled_conditioning = self._get_text_conditioning(
@@ -251,10 +347,26 @@ class StableDiffusionXL(StableDiffusion):
             mx.array([[512, 512, 0, 0, 512, 512.0]] * len(pooled_conditioning)),
         )
 
-        # Create the latent variables
-        x_T = self.sampler.sample_prior(
-            (n_images, *latent_size, self.autoencoder.latent_channels), dtype=self.dtype
-        )
+        # Create the latent variables, n_images for every prompt
+        n_prompts = 1 if isinstance(text, str) else len(text)
+        if keys is None:
+            x_T = self.sampler.sample_prior(
+                (n_prompts * n_images, *latent_size, self.latent_channels),
+                dtype=self.dtype,
+            )
+        else:
+            splits = [mx.random.split(k) for k in keys]
+            keys = [k[0] for k in splits]
+            x_T = mx.concatenate(
+                [
+                    self.sampler.sample_prior(
+                        (1, *latent_size, self.latent_channels),
+                        dtype=self.dtype,
+                        key=k[1],
+                    )
+                    for k in splits
+                ]
+            )
 
         # Perform the denoising loop
         yield from self._denoising_loop(
@@ -264,6 +376,7 @@ class StableDiffusionXL(StableDiffusion):
             num_steps,
             cfg_weight,
             text_time=text_time,
+            keys=keys,
         )
 
     def generate_latents_from_image(
@@ -73,7 +73,7 @@ class SimpleEulerSampler:
         steps = _linspace(start_time, 0, num_steps + 1).astype(dtype)
         return list(zip(steps, steps[1:]))
 
-    def step(self, eps_pred, x_t, t, t_prev):
+    def step(self, eps_pred, x_t, t, t_prev, keys=None):
         sigma = self.sigmas(t).astype(eps_pred.dtype)
         sigma_prev = self.sigmas(t_prev).astype(eps_pred.dtype)
 
@@ -86,7 +86,7 @@ class SimpleEulerSampler:
 
 
 class SimpleEulerAncestralSampler(SimpleEulerSampler):
-    def step(self, eps_pred, x_t, t, t_prev):
+    def step(self, eps_pred, x_t, t, t_prev, keys=None):
         sigma = self.sigmas(t).astype(eps_pred.dtype)
         sigma_prev = self.sigmas(t_prev).astype(eps_pred.dtype)
 
@@ -97,7 +97,15 @@ class SimpleEulerAncestralSampler(SimpleEulerSampler):
 
         dt = sigma_down - sigma
         x_t_prev = (sigma2 + 1).sqrt() * x_t + eps_pred * dt
-        noise = mx.random.normal(x_t_prev.shape).astype(x_t_prev.dtype)
+        if keys is None:
+            noise = mx.random.normal(x_t_prev.shape)
+        else:
+            # Draw the noise of every sample from its own key so that a sample
+            # does not depend on the rest of the batch
+            noise = mx.concatenate(
+                [mx.random.normal((1, *x_t_prev.shape[1:]), key=k) for k in keys]
+            )
+        noise = noise.astype(x_t_prev.dtype)
         x_t_prev = x_t_prev + noise * sigma_up
 
         x_t_prev = x_t_prev * (sigma_prev2 + 1).rsqrt()
@@ -1,20 +1,29 @@
 # Copyright © 2023 Apple Inc.
 
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+
+import mlx.core as mx
 import regex
 
 
 class Tokenizer:
     """A simple port of CLIPTokenizer from https://github.com/huggingface/transformers/ ."""
 
-    def __init__(self, bpe_ranks, vocab):
+    def __init__(self, bpe_ranks, vocab, cache_size: int = 16384):
         self.bpe_ranks = bpe_ranks
         self.vocab = vocab
         self.pat = regex.compile(
             r"""<\|startoftext\|>|<\|endoftext\|>|'s|'t|'re|'ve|'m|'ll|'d|[\p{L}]+|[\p{N}]|[^\s\p{L}\p{N}]+""",
             regex.IGNORECASE,
         )
+        self.whitespace = regex.compile(r"\s+")
 
-        self._cache = {self.bos: self.bos, self.eos: self.eos}
+        # The special tokens are never split, the rest of the words go through
+        # a bounded LRU cache
+        self._special = {self.bos: [self.bos], self.eos: [self.eos]}
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
 
     @property
     def bos(self):
@@ -33,50 +42,74 @@ class Tokenizer:
         return self.vocab[self.eos]
 
     def bpe(self, text):
-        if text in self._cache:
-            return self._cache[text]
-
-        unigrams = list(text[:-1]) + [text[-1] + "</w>"]
-        unique_bigrams = set(zip(unigrams, unigrams[1:]))
+        if text in self._special:
+            return self._special[text]
 
-        if not unique_bigrams:
+        unigrams = self._cache.get(text)
+        if unigrams is not None:
+            self._cache.move_to_end(text)
             return unigrams
 
-        # In every iteration try to merge the two most likely bigrams. If none
-        # was merged we are done.
-        #
-        # Ported from https://github.com/huggingface/transformers/blob/main/src/transformers/models/clip/tokenization_clip.py
-        while unique_bigrams:
-            bigram = min(
-                unique_bigrams, key=lambda pair: self.bpe_ranks.get(pair, float("inf"))
-            )
-            if bigram not in self.bpe_ranks:
-                break
-
-            new_unigrams = []
-            skip = False
-            for a, b in zip(unigrams, unigrams[1:]):
-                if skip:
-                    skip = False
-                    continue
-
-                if (a, b) == bigram:
-                    new_unigrams.append(a + b)
-                    skip = True
-
-                else:
-                    new_unigrams.append(a)
-
-            if not skip:
-                new_unigrams.append(b)
-
-            unigrams = new_unigrams
-            unique_bigrams = set(zip(unigrams, unigrams[1:]))
+        unigrams = self._merge(text)
 
         self._cache[text] = unigrams
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
 
         return unigrams
 
+    def _merge(self, text):
+        unigrams = list(text[:-1]) + [text[-1] + "</w>"]
+        if len(unigrams) == 1:
+            return unigrams
+
+        # The symbols form a linked list and the candidate bigrams sit in a
+        # priority queue ordered by rank then position. Popping the queue
+        # merges the most likely bigram, leftmost first, which gives the same
+        # result as merging all the occurrences of the most likely bigram at
+        # every iteration since a merge only creates bigrams of a higher rank.
+        #
+        # Ported from https://github.com/huggingface/transformers/blob/main/src/transformers/models/clip/tokenization_clip.py
+        ranks = self.bpe_ranks
+        n = len(unigrams)
+        prev_idx = list(range(-1, n - 1))
+        next_idx = list(range(1, n + 1))
+        next_idx[-1] = -1
+
+        queue = []
+        for i in range(n - 1):
+            rank = ranks.get((unigrams[i], unigrams[i + 1]))
+            if rank is not None:
+                queue.append((rank, i, unigrams[i], unigrams[i + 1]))
+        heapify(queue)
+
+        while queue:
+            _, i, a, b = heappop(queue)
+            j = next_idx[i]
+            # Skip the bigrams invalidated by an earlier merge
+            if j == -1 or unigrams[i] != a or unigrams[j] != b:
+                continue
+
+            unigrams[i] = a + b
+            unigrams[j] = None
+            next_idx[i] = next_idx[j]
+            if next_idx[j] != -1:
+                prev_idx[next_idx[j]] = i
+
+            # Queue the bigrams formed with the neighbours of the merged symbol
+            p = prev_idx[i]
+            if p != -1:
+                rank = ranks.get((unigrams[p], unigrams[i]))
+                if rank is not None:
+                    heappush(queue, (rank, p, unigrams[p], unigrams[i]))
+            k = next_idx[i]
+            if k != -1:
+                rank = ranks.get((unigrams[i], unigrams[k]))
+                if rank is not None:
+                    heappush(queue, (rank, i, unigrams[i], unigrams[k]))
+
+        return [u for u in unigrams if u is not None]
+
     def tokenize(self, text, prepend_bos=True, append_eos=True):
         if isinstance(text, list):
             return [self.tokenize(t, prepend_bos, append_eos) for t in text]
@@ -84,8 +117,8 @@ class Tokenizer:
         # Lower case cleanup and split according to self.pat. Hugging Face does
         # a much more thorough job here but this should suffice for 95% of
         # cases.
-        clean_text = regex.sub(r"\s+", " ", text.lower())
-        tokens = regex.findall(self.pat, clean_text)
+        clean_text = self.whitespace.sub(" ", text.lower())
+        tokens = self.pat.findall(clean_text)
 
         # Split the tokens according to the byte-pair merge file
         bpe_tokens = [ti for t in tokens for ti in self.bpe(t)]
@@ -98,3 +131,12 @@ class Tokenizer:
             tokens.append(self.eos_token)
 
         return tokens
+
+    def tokenize_batch(self, texts, max_length=None, pad_token=0):
+        """Tokenize a list of texts into a padded array of token ids."""
+        tokens = self.tokenize(list(texts))
+        N = max(len(t) for t in tokens)
+        if max_length is not None:
+            N = max(N, max_length)
+        tokens = [t + [pad_token] * (N - len(t)) for t in tokens]
+        return mx.array(tokens)
@@ -0,0 +1,115 @@
+from contextlib import aclosing
+from typing import AsyncIterator, Tuple
+import asyncio
+import json
+import threading
+import time
+
+from starlette.requests import Request
+
+_END = object()
+
+
+async def aiter_tokens(tokens) -> AsyncIterator[str]:
+    """Iterate over a sync or async token generator without blocking the loop.
+
+    Closing the iterator closes the generator, which stops the upstream
+    generation.
+    """
+    if hasattr(tokens, "__aiter__"):
+        try:
+            async for token in tokens:
+                yield token
+        finally:
+            if hasattr(tokens, "aclose"):
+                await tokens.aclose()
+        return
+
+    # Blocking generators are advanced on a worker thread, the lock keeps the
+    # generator from being closed while a step is running
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(tokens, _END)
+
+    def close():
+        with lock:
+            tokens.close()
+
+    try:
+        while True:
+            token = await asyncio.to_thread(step)
+            if token is _END:
+                break
+            yield token
+    finally:
+        # Do not wait for the step in flight, if any, to close the generator
+        asyncio.get_running_loop().run_in_executor(None, close)
+
+
+async def token_events(tokens) -> AsyncIterator[Tuple[str, str]]:
+    async with aclosing(aiter_tokens(tokens)) as tokens:
+        async for token in tokens:
+            yield "token", token
+
+
+async def search_events(sources: list[dict], tokens) -> AsyncIterator[Tuple[str, str]]:
+    # The sources are known once retrieval is done, before the answer starts
+    yield "sources", json.dumps(sources)
+    async with aclosing(token_events(tokens)) as events:
+        async for event in events:
+            yield event
+
+
+def format_event(event: str, data: str) -> str:
+    # Every line of the data is framed on its own, the client joins them back
+    # with newlines
+    data = data.replace("\r\n", "\n").replace("\r", "\n")
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+async def event_stream(
+    request: Request,
+    events: AsyncIterator[Tuple[str, str]],
+    heartbeat=15.0,
+    poll=1.0,
+) -> AsyncIterator[str]:
+    """Frame the events as server-sent events until done or disconnected.
+
+    A comment is sent after heartbeat seconds without events so that proxies
+    keep the connection open, and the client is checked every poll seconds
+    while waiting. The events are closed when the client goes away, which
+    cancels the upstream generation.
+    """
+    pending = None
+    last_sent = time.monotonic()
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(events))
+            done, _ = await asyncio.wait({pending}, timeout=poll)
+            if await request.is_disconnected():
+                break
+            if not done:
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            future, pending = pending, None
+            try:
+                event, data = future.result()
+            except StopAsyncIteration:
+                yield format_event("done", "")
+                break
+            except Exception as e:
+                yield format_event("error", str(e))
+                break
+            last_sent = time.monotonic()
+            yield format_event(event, data)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
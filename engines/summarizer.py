@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncGenerator
+import asyncio
+import hashlib
+import threading
+
+from llama_index.core.llms import LLM
+from llama_index.core.node_parser import SentenceSplitter
+
+# Bump the version when the prompts change so that cached summaries expire
+PROMPT_VERSION = "1"
+SUMMARIZE_PROMPT = (
+    "Summarize the following note concisely, keeping the key facts.\n\n"
+    "{text}\n\nSummary:"
+)
+MAP_PROMPT = (
+    "Summarize the following part of a note in a few sentences, keeping the "
+    "key facts.\n\n{text}\n\nSummary:"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of a note. Combine them "
+    "into a single concise summary of the whole note.\n\n{text}\n\nSummary:"
+)
+
+
+def truncate_groups(groups: list[str]) -> str:
+    # Each group fits in a reduce call, keeping the same share of every group
+    # fits all of them while still covering the whole note
+    n = len(groups)
+    return "\n\n".join(group[: len(group) // n] for group in groups)
+
+
+class MapReduceSummarizer:
+    def __init__(
+        self,
+        llm: LLM,
+        chunk_size=1024,
+        chunk_overlap=20,
+        max_reduce_tokens=3072,
+        max_collapse_rounds=3,
+        max_concurrency=4,
+        max_cached_chunks=1024,
+    ):
+        self.llm = llm
+        # The note is split into chunks summarized independently (map), then
+        # the summaries are combined in a final streamed call (reduce)
+        self.splitter = SentenceSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        # Summaries too long for a single reduce call are combined in groups
+        self.reduce_splitter = SentenceSplitter(
+            chunk_size=max_reduce_tokens, chunk_overlap=0
+        )
+        self.max_collapse_rounds = max_collapse_rounds
+        # Maximum number of map calls sent to the LLM at the same time
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        # LRU of the chunk summaries by chunk hash, so that editing a note only
+        # summarizes the chunks that changed
+        self.chunk_summaries = OrderedDict()
+        self.max_cached_chunks = max_cached_chunks
+        self.lock = threading.Lock()
+
+    def chunk_key(self, prompt: str, chunk: str) -> str:
+        key = f"{PROMPT_VERSION}\0{prompt}\0{chunk}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    async def summarize_chunk(self, prompt: str, chunk: str) -> str:
+        key = self.chunk_key(prompt, chunk)
+        with self.lock:
+            summary = self.chunk_summaries.get(key)
+            if summary is not None:
+                self.chunk_summaries.move_to_end(key)
+                return summary
+        async with self.semaphore:
+            response = await self.llm.acomplete(prompt.format(text=chunk))
+        summary = response.text.strip()
+        with self.lock:
+            self.chunk_summaries[key] = summary
+            if len(self.chunk_summaries) > self.max_cached_chunks:
+                self.chunk_summaries.popitem(last=False)
+        return summary
+
+    async def summarize_chunks(self, prompt: str, chunks: list[str]) -> list[str]:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(
+            *[self.summarize_chunk(prompt, chunk) for chunk in chunks]
+        )
+
+    async def summarize(self, text: str) -> AsyncGenerator[str, None]:
+        """Return a stream of the summary of the text, one token delta at a time."""
+        chunks = self.splitter.split_text(text)
+        if len(chunks) <= 1:
+            # A short note is summarized in a single streamed call
+            prompt = SUMMARIZE_PROMPT.format(text=text)
+        else:
+            summaries = await self.summarize_chunks(MAP_PROMPT, chunks)
+            groups = self.reduce_splitter.split_text("\n\n".join(summaries))
+            # Collapse the summaries until they fit in one reduce call, as long
+            # as every round shortens them
+            for _ in range(self.max_collapse_rounds):
+                if len(groups) <= 1:
+                    break
+                summaries = await self.summarize_chunks(REDUCE_PROMPT, groups)
+                collapsed = self.reduce_splitter.split_text("\n\n".join(summaries))
+                if len(collapsed) >= len(groups):
+                    break
+                groups = collapsed
+            prompt = REDUCE_PROMPT.format(text=truncate_groups(groups))
+        response = await self.llm.astream_complete(prompt)
+        return self.__deltas(response)
+
+    async def __deltas(self, response) -> AsyncGenerator[str, None]:
+        # Closing the deltas early closes the request to the LLM
+        async with aclosing(response):
+            async for chunk in response:
+                if chunk.delta:
+                    yield chunk.delta
@@ -0,0 +1,86 @@
+from typing import Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    """Summaries persisted in SQLite, bounded by age and total size."""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024**2,
+        ttl: Optional[float] = 30 * 24 * 3600,
+    ):
+        self.max_bytes = max_bytes
+        # Maximum age of a summary in seconds, None to keep it until evicted
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT, nbytes INTEGER, "
+            "created REAL, accessed REAL)"
+        )
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def key(self, text: str, model: str, prompt_version: str) -> str:
+        # A new model or prompt gives new summaries for the same note
+        key = f"{model}\0{prompt_version}\0{text}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT summary, created FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            summary, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self.db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            self.db.execute(
+                "UPDATE summaries SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self.db.commit()
+        return summary
+
+    def put(self, key: str, summary: str):
+        nbytes = len(summary.encode())
+        if nbytes > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                (key, summary, nbytes, now, now),
+            )
+            self.__evict(now)
+            self.db.commit()
+
+    def __evict(self, now: float):
+        if self.ttl is not None:
+            self.db.execute(
+                "DELETE FROM summaries WHERE created < ?", (now - self.ttl,)
+            )
+        # Remove the least recently used summaries until the cache fits
+        total = self.db.execute("SELECT SUM(nbytes) FROM summaries").fetchone()[0]
+        if not total or total <= self.max_bytes:
+            return
+        rows = self.db.execute(
+            "SELECT key, nbytes FROM summaries ORDER BY accessed"
+        ).fetchall()
+        evicted = []
+        for key, nbytes in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= nbytes
+        self.db.executemany("DELETE FROM summaries WHERE key = ?", evicted)
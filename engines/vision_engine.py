@@ -1,79 +1,210 @@
-import mlx.core as mx
-import mlx.nn as nn
+from enum import Enum
+from io import BytesIO
+import hashlib
+import json
+import random
+import threading
+from typing import TYPE_CHECKING
+
 import numpy as np
 from PIL import Image
 from tqdm import tqdm
 
-from engines.stable_diffusion import StableDiffusionXL
+# MLX and the Stable Diffusion models are imported on the first image request so
+# that processes only serving NLP routes never load them
+if TYPE_CHECKING:
+    from engines.stable_diffusion import StableDiffusionXL
+
+
+class MemoryPolicy(str, Enum):
+    # Keep every component of the pipeline resident between requests
+    KEEP_ALL = "keep-all"
+    # Release the autoencoder after decoding and reload it on the next decode
+    OFFLOAD_VAE = "offload-vae"
+    # Release both text encoders once the conditioning has been computed
+    OFFLOAD_ENCODERS = "offload-encoders"
 
 
 class VisionEngine:
+    def __init__(
+        self,
+        model="stabilityai/sdxl-turbo",
+        float16=False,
+        memory_policy=MemoryPolicy.KEEP_ALL,
+        steps=2,
+        cfg=0.0,
+        negative_text="",
+        latent_size=(64, 64),
+        cache_dir="cache/stable_diffusion",
+        unet_quantization=(32, 8),
+        text_encoder_quantization=(64, 4),
+    ):
+        self.model = model
+        self.float16 = float16
+        # Converted and quantized weights are cached here so that loading a
+        # component is a single safetensors read
+        self.cache_dir = cache_dir
+        self.unet_quantization = unet_quantization
+        self.text_encoder_quantization = text_encoder_quantization
+        self.memory_policy = MemoryPolicy(memory_policy)
+        self.steps = steps
+        self.cfg = cfg
+        self.negative_text = negative_text
+        # Images are 8 times larger than the latents in each dimension
+        self.latent_size = latent_size
+        # The pipeline is created on the first request and reused afterwards
+        self.sd = None
+        # MLX models are not safe to share between concurrent generations
+        self.lock = threading.Lock()
+
     def save_img(self, tensor, img_name) -> Image:
         img = Image.fromarray(tensor)
         img.save(img_name)
         return img
 
-    def __text_to_img(self, text):
-        # Stable diffusion XL
-        sd = StableDiffusionXL("stabilityai/sdxl-turbo", float16=False)
+    def img_key(self, text, seed, img_format="jpeg", quality=90) -> str:
+        # Content address of an image, every setting the image bytes depend on
+        # is part of the key
+        settings = {
+            "model": self.model,
+            "float16": self.float16,
+            "text": text,
+            "negative_text": self.negative_text,
+            "seed": seed,
+            "steps": self.steps,
+            "cfg": self.cfg,
+            "latent_size": list(self.latent_size),
+            "format": img_format,
+            "quality": quality,
+        }
+        return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
 
-        # Quantization
-        nn.quantize(
-            sd.text_encoder_1, class_predicate=lambda _, m: isinstance(m, nn.Linear)
-        )
-        nn.quantize(
-            sd.text_encoder_2, class_predicate=lambda _, m: isinstance(m, nn.Linear)
-        )
-        nn.quantize(sd.unet, group_size=32, bits=8)
+    def encode_img(self, tensor, img_format="jpeg", quality=90) -> bytes:
+        # Encode the image straight into memory instead of going through disk
+        img = Image.fromarray(tensor)
+        buffer = BytesIO()
+        if img_format == "png":
+            img.save(buffer, format="PNG")
+        else:
+            img.save(buffer, format=img_format.upper(), quality=quality)
+        return buffer.getvalue()
+
+    def __load_text_encoders(self, sd: "StableDiffusionXL"):
+        import mlx.core as mx
+        from engines.stable_diffusion.model_io import load_text_encoder
+
+        for i, model_key in enumerate(("text_encoder", "text_encoder_2")):
+            text_encoder = load_text_encoder(
+                self.model,
+                self.float16,
+                model_key=model_key,
+                quantization=self.text_encoder_quantization,
+                cache_dir=self.cache_dir,
+            )
+            mx.eval(text_encoder.parameters())
+            setattr(sd, f"text_encoder_{i + 1}", text_encoder)
+
+    def __load_autoencoder(self, sd: "StableDiffusionXL"):
+        import mlx.core as mx
+        from engines.stable_diffusion.model_io import load_autoencoder
+
+        sd.autoencoder = load_autoencoder(self.model, False, cache_dir=self.cache_dir)
+        mx.eval(sd.autoencoder.parameters())
 
-        cfg = 0.0
-        steps = 2
+    def load_pipeline(self) -> "StableDiffusionXL":
+        if self.sd is not None:
+            return self.sd
+        from engines.stable_diffusion import StableDiffusionXL
 
-        # Ensure that models are read in memory if needed
+        # Stable diffusion XL with quantized UNet and text encoders
+        sd = StableDiffusionXL(
+            self.model,
+            float16=self.float16,
+            cache_dir=self.cache_dir,
+            unet_quantization=self.unet_quantization,
+            text_encoder_quantization=self.text_encoder_quantization,
+        )
+
+        # Ensure that models are read in memory once
         sd.ensure_models_are_loaded()
+        self.sd = sd
+        return sd
+
+    def __release(self, sd: "StableDiffusionXL", *components):
+        import mlx.core as mx
+
+        # Help in memory constrained systems by handing the memory kept by the
+        # offloaded components back to the allocator
+        for component in components:
+            setattr(sd, component, None)
+        mx.metal.clear_cache()
+
+    def __text_to_imgs(self, texts, seeds):
+        import mlx.core as mx
 
-        # Generate the latent vectors using diffusion
+        sd = self.load_pipeline()
+
+        # Reload the components offloaded by the previous request, the text
+        # encoders are not needed when the conditioning of every prompt is cached
+        encoders_offloaded = sd.text_encoder_1 is None or sd.text_encoder_2 is None
+        if encoders_offloaded and not sd.is_conditioning_cached(
+            texts, self.cfg, self.negative_text
+        ):
+            self.__load_text_encoders(sd)
+
+        # Generate the latent vectors of all prompts in one batch using diffusion
         latents = sd.generate_latents(
-            text,
+            texts,
             n_images=1,
-            cfg_weight=cfg,
-            num_steps=steps,
-            seed=None,
-            negative_text="",
+            cfg_weight=self.cfg,
+            num_steps=self.steps,
+            seed=seeds,
+            negative_text=self.negative_text,
+            latent_size=self.latent_size,
         )
 
-        for x_t in tqdm(latents, total=steps):
+        for x_t in tqdm(latents, total=self.steps):
             mx.eval(x_t)
 
-        # help in memory constrained systems by reusing the memory kept by the unet and the text encoders.
-        del sd.text_encoder_1
-        del sd.text_encoder_2
-        del sd.unet
-        del sd.sampler
+        if self.memory_policy == MemoryPolicy.OFFLOAD_ENCODERS and (
+            sd.text_encoder_1 is not None or sd.text_encoder_2 is not None
+        ):
+            self.__release(sd, "text_encoder_1", "text_encoder_2")
         # Memory used by UNet in GBs
         peak_mem_unet = mx.metal.get_peak_memory() / 1024**3
 
-        # Decode them into images
-        decoded = []
-        for i in tqdm(range(0, 1, 1)):
-            decoded.append(sd.decode(x_t[i : i + 1]))
-            mx.eval(decoded[-1])
+        if sd.autoencoder is None:
+            self.__load_autoencoder(sd)
+
+        # Decode them into images one at a time to bound the decoder memory
+        imgs = []
+        for i in tqdm(range(0, len(texts), 1)):
+            x = sd.decode(x_t[i : i + 1])
+            x = mx.pad(x[0], [(8, 8), (8, 8), (0, 0)])
+            x = (x * 255).astype(mx.uint8)
+            imgs.append(np.array(x))
         peak_mem_overall = mx.metal.get_peak_memory() / 1024**3
 
-        # Arrange them on a grid
-        x = mx.concatenate(decoded, axis=0)
-        x = mx.pad(x, [(0, 0), (8, 8), (8, 8), (0, 0)])
-        B, H, W, C = x.shape
-        x = x.reshape(1, B, H, W, C).transpose(0, 2, 1, 3, 4)
-        x = x.reshape(H, B * W, C)
-        x = (x * 255).astype(mx.uint8)
+        if self.memory_policy == MemoryPolicy.OFFLOAD_VAE:
+            self.__release(sd, "autoencoder")
+
         # Report the peak memory used during generation
         print(f"Peak memory used for the unet: {peak_mem_unet:.3f}GB")
         print(f"Peak memory used overall:      {peak_mem_overall:.3f}GB")
-        return np.array(x)
+        cache = sd.conditioning_cache
+        print(f"Conditioning cache hits/misses: {cache.hits}/{cache.misses}")
+        return imgs
+
+    def text_to_imgs(self, texts, seeds=None) -> list[np.ndarray]:
+        # Generate one image tensor per prompt with a single batched pipeline,
+        # prompts without a seed get a random one
+        seeds = seeds or [None] * len(texts)
+        seeds = [random.getrandbits(32) if s is None else s for s in seeds]
+        with self.lock:
+            return self.__text_to_imgs(texts, seeds)
 
-    def text_to_img(self, text, img_name):
+    def text_to_img(self, text, img_name, seed=None):
         # Generate image tensor from text
-        t = self.__text_to_img(text)
+        t = self.text_to_imgs([text], [seed])[0]
         # Save them to disc
         self.save_img(t, img_name)
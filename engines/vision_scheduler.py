@@ -0,0 +1,109 @@
+from concurrent.futures import Future
+import asyncio
+import math
+import queue
+import threading
+import time
+
+from engines.vision_engine import VisionEngine
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Text-to-image queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TextToImgScheduler:
+    def __init__(
+        self,
+        vision_engine: VisionEngine,
+        max_batch_size=4,
+        max_wait=0.05,
+        max_queue_size=16,
+        timeout=120.0,
+    ):
+        self.vision_engine = vision_engine
+        # Maximum number of prompts denoised together in one UNet batch
+        self.max_batch_size = max_batch_size
+        # Maximum time in seconds the first prompt of a batch waits for others
+        self.max_wait = max_wait
+        # Prompts beyond the queue size are rejected instead of piling up
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        # Maximum time in seconds a request waits for its image
+        self.timeout = timeout
+        # Running estimate of the time taken by one batch, used for Retry-After
+        self.batch_time = 10.0
+        # The worker thread is the only owner of the MLX model
+        self.worker = threading.Thread(target=self.__run, daemon=True)
+        self.worker.start()
+
+    def retry_after(self) -> int:
+        # Time in seconds until the queued batches are expected to be processed
+        n_batches = self.queue.qsize() / self.max_batch_size + 1
+        return math.ceil(self.batch_time * n_batches)
+
+    def submit(self, text, seed=None) -> Future:
+        # The future resolves to the image tensor generated for the prompt
+        future = Future()
+        try:
+            self.queue.put_nowait((text, seed, future))
+        except queue.Full:
+            raise QueueFullError(self.retry_after())
+        return future
+
+    async def generate(self, text, seed=None):
+        # Wait for the image without blocking the event loop, a request timing
+        # out before its batch starts is removed from the queue
+        future = self.submit(text, seed)
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def __next_batch(self):
+        # Block until a prompt arrives then collect the prompts arriving within
+        # the batching window
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def __run(self):
+        while True:
+            batch = self.__next_batch()
+            # Drop the requests that were cancelled while waiting
+            batch = [
+                (text, seed, future)
+                for text, seed, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                self.__generate(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][2].set_exception(e)
+                    continue
+                # Generate the prompts one by one so that only the requests
+                # causing the failure fail
+                for request in batch:
+                    try:
+                        self.__generate([request])
+                    except Exception as e:
+                        request[2].set_exception(e)
+
+    def __generate(self, batch):
+        texts = [text for text, _, _ in batch]
+        seeds = [seed for _, seed, _ in batch]
+        start = time.monotonic()
+        imgs = self.vision_engine.text_to_imgs(texts, seeds)
+        self.batch_time = 0.8 * self.batch_time + 0.2 * (time.monotonic() - start)
+        # Fan the images back out to the waiting requests
+        for (_, _, future), img in zip(batch, imgs):
+            future.set_result(img)
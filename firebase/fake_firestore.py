@@ -0,0 +1,112 @@
+"""In-memory stand-in for a Firestore collection."""
+
+from enum import Enum
+from typing import Callable, Dict, List
+
+
+class ChangeType(Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data: dict) -> None:
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type: ChangeType, document: FakeDocumentSnapshot):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self, collection: "FakeCollection", callback: Callable) -> None:
+        self._collection = collection
+        self._callback = callback
+
+    def unsubscribe(self) -> None:
+        self._collection._listeners.remove(self._callback)
+
+
+class FakeQuery:
+    """Query over a fake collection ordered by document ID."""
+
+    def __init__(
+        self, collection: "FakeCollection", limit=None, start_after=None
+    ) -> None:
+        self._collection = collection
+        self._limit = limit
+        self._start_after = start_after
+
+    def order_by(self, field_path: str) -> "FakeQuery":
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self._collection, count, self._start_after)
+
+    def start_after(self, document: FakeDocumentSnapshot) -> "FakeQuery":
+        return FakeQuery(self._collection, self._limit, document.id)
+
+    def stream(self):
+        doc_ids = sorted(self._collection._docs)
+        if self._start_after is not None:
+            doc_ids = [d for d in doc_ids if d > self._start_after]
+        if self._limit is not None:
+            doc_ids = doc_ids[: self._limit]
+        for doc_id in doc_ids:
+            yield self._collection._snapshot(doc_id)
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollection:
+    """Firestore collection kept in memory for tests.
+
+    Supports ``get``, paged queries ordered by document ID and ``on_snapshot``
+    with the same callback signature as Firestore. Listeners are called
+    synchronously on every change.
+
+    """
+
+    def __init__(self) -> None:
+        self._docs: Dict[str, dict] = {}
+        self._listeners: List[Callable] = []
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return [FakeDocumentSnapshot(k, v) for k, v in self._docs.items()]
+
+    def order_by(self, field_path: str) -> FakeQuery:
+        return FakeQuery(self)
+
+    def set(self, doc_id: str, data: dict) -> None:
+        change_type = ChangeType.MODIFIED if doc_id in self._docs else ChangeType.ADDED
+        self._docs[doc_id] = dict(data)
+        self._notify([FakeDocumentChange(change_type, self._snapshot(doc_id))])
+
+    def delete(self, doc_id: str) -> None:
+        snapshot = self._snapshot(doc_id)
+        del self._docs[doc_id]
+        self._notify([FakeDocumentChange(ChangeType.REMOVED, snapshot)])
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        self._listeners.append(callback)
+        # Like Firestore, the first snapshot reports every document as added
+        changes = [
+            FakeDocumentChange(ChangeType.ADDED, snapshot) for snapshot in self.get()
+        ]
+        callback(self.get(), changes, None)
+        return FakeWatch(self, callback)
+
+    def _snapshot(self, doc_id: str) -> FakeDocumentSnapshot:
+        return FakeDocumentSnapshot(doc_id, self._docs[doc_id])
+
+    def _notify(self, changes: List[FakeDocumentChange]) -> None:
+        for callback in list(self._listeners):
+            callback(self.get(), changes, None)
@@ -1,22 +1,25 @@
 """Firebase Realtime Database Loader."""
 
-from typing import List, Optional
+from typing import Dict, Optional, Tuple
 
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
-from llama_index.core.readers.base import BaseReader
-from llama_index.core.schema import Document
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
 import json
 import os
+import queue
+import threading
+import time
 from config import FIREBASE_NOTE_COLLECTION, FIREBASE_DB_LOCAL
+from engines.html_text import DEFAULT_BACKEND, html_to_text, html_to_texts
 
 
-class FirebaseFirestoreReader(BaseReader):
+class FirebaseFirestoreReader:
     """Firebase Realtime Database reader.
 
-    Retrieves data from Firebase Realtime Database and converts it into the Document used by LlamaIndex.
+    Retrieves the notes from Firebase and writes them to local JSON files, the
+    documents of the indexes are built from these files.
 
     Args:
         database_url (str): Firebase Realtime Database URL.
@@ -36,30 +39,158 @@ class FirebaseFirestoreReader(BaseReader):
         )
         self.client = firestore.client(self.app)
 
-    def load_data(self) -> List[Document]:
-        """Load data from Firebase Realtime Database and convert it into documents.
+    def collection(self):
+        """Return the Firestore collection of the notes."""
+        return self.client.collection(FIREBASE_NOTE_COLLECTION)
+
+    def load_data(
+        self,
+        page_size: int = 100,
+        html_backend: str = DEFAULT_BACKEND,
+        max_workers: Optional[int] = None,
+        indexed: Optional[Dict[str, Dict[str, str]]] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Load data from Firebase Realtime Database and write it to local JSON files.
+
+        The notes are read in pages ordered by document ID. The next page is
+        fetched while the current one is parsed and written, and at most a few
+        pages are held in memory at once. The text of every page is extracted
+        across a pool of processes. Notes already indexed with the same
+        modification time keep their local file and are not extracted again.
 
         Args:
-            collection (str): Name of the collection to be read from the Firestore.
+            page_size (int): Number of notes fetched per request.
+            html_backend (str): Backend extracting the text of the notes.
+            max_workers (Optional[int]): Number of extraction processes, 0 to
+                extract in the current process.
+            indexed (Optional[Dict[str, Dict[str, str]]]): Last modification
+                time of the indexed notes, by user ID and note ID.
+
+        Returns:
+            Dict[str, Dict[str, str]]: Last modification time of every note, by
+            user ID and note ID.
+
+        """
+        indexed = indexed or {}
+        pages = queue.Queue(maxsize=2)
+        # Set when the consumer stops so that the producer does not block on a
+        # full queue nobody reads anymore
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._fetch_pages, args=(pages, page_size, stop), daemon=True
+        )
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers) if max_workers else None
+        start = time.perf_counter()
+        producer.start()
+        docs = {}
+        n_docs = 0
+        n_changed = 0
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                changed = []
+                for doc in page:
+                    doc_dict = doc.to_dict()
+                    user_id = doc_dict["userId"]
+                    last_modified = doc_dict["lastModified"].isoformat()
+                    docs.setdefault(user_id, {})[doc.id] = last_modified
+                    indexed_time = indexed.get(user_id, {}).get(doc.id)
+                    path = note_path(user_id, doc.id)
+                    if indexed_time != last_modified or not os.path.exists(path):
+                        changed.append((doc.id, doc_dict))
+                texts = html_to_texts(
+                    [d["content"] for _, d in changed],
+                    html_backend,
+                    executor,
+                    max_workers,
+                )
+                for (doc_id, doc_dict), text in zip(changed, texts):
+                    write_note(doc_id, doc_dict, text)
+                n_docs += len(page)
+                n_changed += len(changed)
+        finally:
+            stop.set()
+            if executor is not None:
+                executor.shutdown()
+        elapsed = time.perf_counter() - start
+        print(
+            f"Loaded {n_docs} notes, {n_changed} changed, in {elapsed:.2f}s "
+            f"({n_docs / max(elapsed, 1e-9):.1f} docs/s)"
+        )
+        return docs
+
+    def _fetch_pages(
+        self, pages: queue.Queue, page_size: int, stop: threading.Event
+    ) -> None:
+        """Put the pages of notes on the queue followed by None when done.
 
+        Fetching ends early once stop is set.
         """
-        doc_list = self.client.collection(FIREBASE_NOTE_COLLECTION).get()
-        for doc in doc_list:
-            doc_dict = doc.to_dict()
-            user_id = doc_dict["userId"]
-            # Create a directory for the user if it does not exist
-            os.makedirs(f"{FIREBASE_DB_LOCAL}/{user_id}", exist_ok=True)
-            # Write user data to a JSON file
-            with open(f"{FIREBASE_DB_LOCAL}/{user_id}/{doc.id}.json", "w+") as f:
-                html_content = doc_dict["content"]
-                soup = BeautifulSoup(html_content, features="html.parser")
-                parsed_content = soup.get_text()
-                json_data = {
-                    "id": doc.id,
-                    "thumbnail": doc_dict["thumbnail"],
-                    "title": doc_dict["title"],
-                    "lastModified": doc_dict["lastModified"].isoformat(),
-                    "lastAccessed": doc_dict["lastAccessed"].isoformat(),
-                    "content": parsed_content,
-                }
-                f.write(json.dumps(json_data))
+        try:
+            query = self.collection().order_by("__name__").limit(page_size)
+            last_doc = None
+            while not stop.is_set():
+                page_query = query if last_doc is None else query.start_after(last_doc)
+                page = list(page_query.stream())
+                if page and not _put(pages, page, stop):
+                    return
+                if len(page) < page_size:
+                    break
+                last_doc = page[-1]
+        except Exception as e:
+            _put(pages, e, stop)
+            return
+        _put(pages, None, stop)
+
+
+def _put(pages: queue.Queue, item, stop: threading.Event, poll=0.1) -> bool:
+    """Put the item on the queue, False if stop was set while waiting."""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=poll)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def note_path(user_id: str, doc_id: str) -> str:
+    """Return the path of the local JSON file of a note."""
+    return f"{FIREBASE_DB_LOCAL}/{user_id}/{doc_id}.json"
+
+
+def write_note(
+    doc_id: str, doc_dict: dict, text: Optional[str] = None
+) -> Tuple[str, str]:
+    """Write a note to its local JSON file.
+
+    The text is extracted from the HTML content unless already given.
+
+    Returns:
+        Tuple[str, str]: The user ID and the last modification time of the note.
+
+    """
+    user_id = doc_dict["userId"]
+    last_modified = doc_dict["lastModified"].isoformat()
+    # Create a directory for the user if it does not exist
+    os.makedirs(f"{FIREBASE_DB_LOCAL}/{user_id}", exist_ok=True)
+    # Write user data to a JSON file
+    with open(note_path(user_id, doc_id), "w+") as f:
+        if text is None:
+            text = html_to_text(doc_dict["content"])
+        json_data = {
+            "id": doc_id,
+            "thumbnail": doc_dict["thumbnail"],
+            "title": doc_dict["title"],
+            "lastModified": last_modified,
+            "lastAccessed": doc_dict["lastAccessed"].isoformat(),
+            "content": text,
+        }
+        f.write(json.dumps(json_data))
+    return user_id, last_modified
@@ -6,6 +6,8 @@ class SummaryModel(BaseModel):
     user_id: str
     doc_id: str
     text: str
+    # Generate a new summary even if one is cached for the same text
+    bypass_cache: bool = False
 
 
 class QAModel(BaseModel):
@@ -13,6 +15,8 @@ class QAModel(BaseModel):
     doc_id: str
     query: str
     context: str
+    # Try a span of the note with the extractive model before the LLM
+    tiered: bool = True
 
 
 class SearchModel(BaseModel):
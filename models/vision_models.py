@@ -1,5 +1,12 @@
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
 
 
 class TextToImgModel(BaseModel):
     text: str
+    # Images generated with a seed are reproducible and cached
+    seed: Optional[int] = Field(None, ge=0, lt=2**32)
+    format: Literal["jpeg", "png", "webp"] = "jpeg"
+    quality: int = Field(90, ge=1, le=100)
+    # Keep a copy of the image in the bounded image store
+    persist: bool = False
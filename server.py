@@ -1,13 +1,20 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 
 from engines.nlp_engine import NLPEngine
+from engines.note_listener import NoteChangeListener
 from engines.vision_engine import VisionEngine
+from engines.image_cache import ImageCache
+from engines.image_store import ImageStore
+from engines.vision_scheduler import TextToImgScheduler, QueueFullError
+from engines.streaming import event_stream, search_events, token_events
 from models.nlp_models import SummaryModel, QAModel, SearchModel
 from models.vision_models import TextToImgModel
 from config import FIREBASE_DB_LOCAL
+import asyncio
 import json
 import nest_asyncio
 
@@ -15,7 +22,18 @@ nest_asyncio.apply()
 
 app = FastAPI()
 nlp_engine = NLPEngine()
+# Keep the search index in sync with the notes edited after startup
+note_listener = NoteChangeListener(nlp_engine, nlp_engine.db_reader.collection())
 vision_engine = VisionEngine()
+# Coalesce concurrent text-to-image prompts into batched generations
+text_to_img_scheduler = TextToImgScheduler(vision_engine)
+# Bounded store for the generated images that are asked to be kept, in a
+# directory of its own since eviction removes any file in it
+image_store = ImageStore(
+    "images/generated", max_bytes=512 * 1024**2, max_age=7 * 24 * 3600
+)
+# Rendered images of seeded prompts keyed by their content address
+image_cache = ImageCache(max_bytes=256 * 1024**2)
 
 # Define origins for CORS
 origins = ["http://localhost", "http://localhost:5173"]
@@ -30,8 +48,35 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup_handler():
+    note_listener.start(asyncio.get_running_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_handler():
+    note_listener.stop()
+
+
+# Server-sent events must reach the client as soon as they are written
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def wants_event_stream(request: Request) -> bool:
+    # Clients opt into server-sent events through the Accept header
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def event_stream_response(request: Request, events) -> StreamingResponse:
+    return StreamingResponse(
+        event_stream(request, events),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @app.post("/summarize", response_model=str)
-async def summarization_handler(summary_model: SummaryModel):
+async def summarization_handler(summary_model: SummaryModel, request: Request):
     if summary_model.text == "document":
         with open(
             f"{FIREBASE_DB_LOCAL}/{summary_model.user_id}/{summary_model.doc_id}.json",
@@ -43,12 +88,18 @@ async def summarization_handler(summary_model: SummaryModel):
         text = summary_model.text
     # summary = nlp_engine.summarize(text)
     # return summary
-    ans_gen = await nlp_engine.summarize(text)
+    ans_gen = await nlp_engine.summarize(
+        text,
+        html=summary_model.text != "document",
+        bypass_cache=summary_model.bypass_cache,
+    )
+    if wants_event_stream(request):
+        return event_stream_response(request, token_events(ans_gen))
     return StreamingResponse(ans_gen)
 
 
 @app.post("/qa", response_model=str)
-async def qa_handler(qa_model: QAModel):
+async def qa_handler(qa_model: QAModel, request: Request):
     if qa_model.context == "document":
         with open(
             f"{FIREBASE_DB_LOCAL}/{qa_model.user_id}/{qa_model.doc_id}.json", "r+"
@@ -57,23 +108,64 @@ async def qa_handler(qa_model: QAModel):
         context = doc["content"]
     else:
         context = qa_model.context
-    ans_gen = await nlp_engine.answer_question(qa_model.query, context)
+    ans_gen = await nlp_engine.answer_question(
+        qa_model.query,
+        context,
+        qa_model.user_id,
+        qa_model.doc_id,
+        html=qa_model.context != "document",
+        tiered=qa_model.tiered,
+    )
+    if wants_event_stream(request):
+        return event_stream_response(request, token_events(ans_gen))
     return StreamingResponse(ans_gen)
 
 
 @app.post("/text-to-img")
-def text_to_img_handler(text_to_img_model: TextToImgModel):
+async def text_to_img_handler(text_to_img_model: TextToImgModel):
     text = text_to_img_model.text
-    img_id = str(uuid.uuid4())
-    img_name = f"images/{img_id}.jpg"
-    vision_engine.text_to_img(text, img_name)
-    return FileResponse(img_name)
+    seed = text_to_img_model.seed
+    img_format = text_to_img_model.format
+    quality = text_to_img_model.quality
+    img_key = None
+    img_bytes = None
+    if seed is not None:
+        img_key = vision_engine.img_key(text, seed, img_format, quality)
+        img_bytes = image_cache.get(img_key)
+    if img_bytes is None:
+        img_bytes = await generate_img(text, seed, img_format, quality)
+        if img_key is not None:
+            image_cache.put(img_key, img_bytes)
+    headers = {}
+    if text_to_img_model.persist:
+        img_id = str(uuid.uuid4())
+        await run_in_threadpool(image_store.save, img_id, img_bytes, img_format)
+        headers["X-Image-Id"] = img_id
+    return Response(img_bytes, media_type=f"image/{img_format}", headers=headers)
+
+
+async def generate_img(text, seed, img_format, quality) -> bytes:
+    try:
+        img = await text_to_img_scheduler.generate(text, seed)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Image generation timed out")
+    return await run_in_threadpool(vision_engine.encode_img, img, img_format, quality)
 
 
 @app.post("/search", response_model=dict)
-async def search_handler(search_model: SearchModel):
+async def search_handler(search_model: SearchModel, request: Request):
     user_id = search_model.user_id
     query = search_model.query
+    if wants_event_stream(request):
+        # The sources are sent before the answer tokens
+        src, ans_gen = await nlp_engine.search_stream(user_id, query, top_n=1)
+        return event_stream_response(request, search_events(src, ans_gen))
     response, src = await nlp_engine.search(user_id, query, top_n=1)
     result = {"answer": response, "src": src}
     return result
@@ -83,5 +175,5 @@ async def search_handler(search_model: SearchModel):
 async def filter_handler(search_model: SearchModel):
     user_id = search_model.user_id
     query = search_model.query
-    _, src = await nlp_engine.search(user_id, query, top_n=5)
+    src = await nlp_engine.retrieve(user_id, query, top_n=5)
     return src
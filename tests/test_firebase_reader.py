@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+import json
+
+import pytest
+
+import firebase.firebase_reader
+from firebase.fake_firestore import FakeCollection
+from firebase.firebase_reader import FirebaseFirestoreReader
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeReader(FirebaseFirestoreReader):
+    """Reads the notes from a fake collection instead of Firestore."""
+
+    def __init__(self, collection):
+        self.fake_collection = collection
+
+    def collection(self):
+        return self.fake_collection
+
+
+def note(user_id="u1", minutes=0, content="<p>Hello</p>"):
+    return {
+        "userId": user_id,
+        "title": "Title",
+        "thumbnail": "",
+        "content": content,
+        "lastModified": T0 + timedelta(minutes=minutes),
+        "lastAccessed": T0 + timedelta(minutes=minutes),
+    }
+
+
+@pytest.fixture(autouse=True)
+def local_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(firebase.firebase_reader, "FIREBASE_DB_LOCAL", str(tmp_path))
+    return tmp_path
+
+
+def read_text(path):
+    with open(path) as f:
+        return json.load(f)["content"]
+
+
+def test_load_data_pages_through_every_note(local_db):
+    collection = FakeCollection()
+    for i in range(7):
+        collection.set(f"n{i}", note(user_id=f"u{i % 2}", minutes=i))
+
+    docs = FakeReader(collection).load_data(page_size=3, max_workers=0)
+
+    assert sorted(docs) == ["u0", "u1"]
+    assert sum(len(user_docs) for user_docs in docs.values()) == 7
+    assert docs["u1"]["n1"] == note(minutes=1)["lastModified"].isoformat()
+    assert read_text(local_db / "u0" / "n0.json") == "Hello"
+
+
+def test_load_data_skips_indexed_notes(local_db):
+    collection = FakeCollection()
+    collection.set("n1", note())
+    collection.set("n2", note(minutes=1))
+    collection.set("n3", note(minutes=2))
+    reader = FakeReader(collection)
+    indexed = reader.load_data(max_workers=0)
+
+    # Mark the local copies to see which ones are written again
+    for doc_id in ("n1", "n2", "n3"):
+        path = local_db / "u1" / f"{doc_id}.json"
+        path.write_text(json.dumps({"content": "stale"}))
+    (local_db / "u1" / "n3.json").unlink()
+    collection.set("n2", note(minutes=5, content="<p>Edited</p>"))
+
+    docs = reader.load_data(max_workers=0, indexed=indexed)
+
+    assert docs["u1"]["n2"] == note(minutes=5)["lastModified"].isoformat()
+    # Unchanged notes keep their file, changed and missing ones are written
+    assert read_text(local_db / "u1" / "n1.json") == "stale"
+    assert read_text(local_db / "u1" / "n2.json") == "Edited"
+    assert read_text(local_db / "u1" / "n3.json") == "Hello"
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+
+import pytest
+
+import firebase.firebase_reader
+from engines.note_listener import NoteChangeListener
+from firebase.fake_firestore import FakeCollection
+
+DEBOUNCE = 0.05
+MAX_DELAY = 0.3
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeNLPEngine:
+    """Records the index updates instead of embedding the notes."""
+
+    def __init__(self, manifest=None):
+        self.manifest = manifest or {}
+        self.synced = []
+        self.removed = []
+
+    def sync_search_index(self, user_id, remote_docs):
+        self.synced.append((user_id, dict(remote_docs)))
+        self.manifest[user_id] = dict(remote_docs)
+
+    def remove_search_index(self, user_id):
+        self.removed.append(user_id)
+        self.manifest.pop(user_id, None)
+
+
+def note(user_id="u1", minutes=0, content="<p>Hello</p>"):
+    return {
+        "userId": user_id,
+        "title": "Title",
+        "thumbnail": "",
+        "content": content,
+        "lastModified": T0 + timedelta(minutes=minutes),
+        "lastAccessed": T0 + timedelta(minutes=minutes),
+    }
+
+
+@pytest.fixture(autouse=True)
+def local_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(firebase.firebase_reader, "FIREBASE_DB_LOCAL", str(tmp_path))
+    return tmp_path
+
+
+async def settle():
+    # Long enough for the debounce to expire and the batch to be applied
+    await asyncio.sleep(DEBOUNCE * 6)
+
+
+def run(test, engine, collection):
+    async def main():
+        listener = NoteChangeListener(engine, collection, DEBOUNCE, MAX_DELAY)
+        listener.start(asyncio.get_running_loop())
+        try:
+            await test(listener)
+        finally:
+            listener.stop()
+
+    asyncio.run(main())
+
+
+def test_add_modify_delete(local_db):
+    engine = FakeNLPEngine()
+    collection = FakeCollection()
+
+    async def test(listener):
+        await settle()
+        collection.set("n1", note())
+        await settle()
+        assert engine.synced[-1] == ("u1", {"n1": note()["lastModified"].isoformat()})
+        assert (local_db / "u1" / "n1.json").exists()
+
+        collection.set("n1", note(minutes=5))
+        await settle()
+        assert engine.synced[-1] == (
+            "u1",
+            {"n1": note(minutes=5)["lastModified"].isoformat()},
+        )
+
+        collection.delete("n1")
+        await settle()
+        assert engine.removed == ["u1"]
+
+    run(test, engine, collection)
+    assert len(engine.synced) == 2
+
+
+def test_delete_keeps_other_notes_of_the_user():
+    engine = FakeNLPEngine()
+    collection = FakeCollection()
+
+    async def test(listener):
+        collection.set("n1", note())
+        collection.set("n2", note(minutes=1))
+        await settle()
+        collection.delete("n1")
+        await settle()
+
+    run(test, engine, collection)
+    assert engine.removed == []
+    assert engine.synced[-1] == (
+        "u1",
+        {"n2": note(minutes=1)["lastModified"].isoformat()},
+    )
+
+
+def test_initial_snapshot_skips_indexed_notes(local_db):
+    indexed = note()
+    engine = FakeNLPEngine({"u1": {"n1": indexed["lastModified"].isoformat()}})
+    collection = FakeCollection()
+    collection.set("n1", indexed)
+    collection.set("n2", note(user_id="u2"))
+
+    async def test(listener):
+        await settle()
+
+    run(test, engine, collection)
+    # Only the note missing from the manifest is written and indexed
+    assert [user_id for user_id, _ in engine.synced] == ["u2"]
+    assert not (local_db / "u1" / "n1.json").exists()
+    assert (local_db / "u2" / "n2.json").exists()
+
+
+def test_debounce_coalesces_a_burst_of_edits():
+    engine = FakeNLPEngine()
+    collection = FakeCollection()
+
+    async def test(listener):
+        await settle()
+        for minutes in range(5):
+            collection.set("n1", note(minutes=minutes))
+            await asyncio.sleep(DEBOUNCE / 5)
+        await settle()
+
+    run(test, engine, collection)
+    # One re-embed with the latest version of the note
+    assert engine.synced == [
+        ("u1", {"n1": note(minutes=4)["lastModified"].isoformat()})
+    ]
+
+
+def test_max_delay_flushes_under_continuous_editing():
+    engine = FakeNLPEngine()
+    collection = FakeCollection()
+
+    async def test(listener):
+        await settle()
+        # Edits arrive faster than the debounce for twice the max delay
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        minutes = 0
+        while loop.time() - start < 2 * MAX_DELAY:
+            collection.set("n1", note(minutes=minutes))
+            minutes += 1
+            await asyncio.sleep(DEBOUNCE / 2)
+        # The batch was applied while the edits were still coming
+        assert len(engine.synced) >= 1
+        await settle()
+
+    run(test, engine, collection)
+    assert 2 <= len(engine.synced) <= 3
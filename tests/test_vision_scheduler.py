@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import pytest
+
+from engines.vision_scheduler import QueueFullError, TextToImgScheduler
+
+MAX_WAIT = 0.05
+TIMEOUT = 5.0
+
+
+class FakeVisionEngine:
+    """Returns the prompt as the image, generations wait for the gate."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def text_to_imgs(self, texts, seeds=None):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.gate.wait(TIMEOUT)
+        if any(seed is not None and seed < 0 for seed in seeds):
+            raise ValueError("Invalid seed")
+        return [text.upper() for text in texts]
+
+
+def busy_scheduler(**kwargs) -> tuple[FakeVisionEngine, TextToImgScheduler]:
+    # The worker is left generating the first prompt until the gate opens
+    engine = FakeVisionEngine()
+    scheduler = TextToImgScheduler(engine, max_wait=MAX_WAIT, **kwargs)
+    scheduler.submit("first")
+    assert engine.started.wait(TIMEOUT)
+    return engine, scheduler
+
+
+def test_batch_fans_out_to_every_request():
+    engine, scheduler = busy_scheduler(max_batch_size=4)
+    futures = [scheduler.submit(text) for text in ("a", "b", "c")]
+    engine.gate.set()
+
+    assert [f.result(TIMEOUT) for f in futures] == ["A", "B", "C"]
+    assert engine.calls == [["first"], ["a", "b", "c"]]
+
+
+def test_batches_are_capped_at_the_batch_size():
+    engine, scheduler = busy_scheduler(max_batch_size=2)
+    futures = [scheduler.submit(text) for text in ("a", "b", "c")]
+    engine.gate.set()
+
+    assert [f.result(TIMEOUT) for f in futures] == ["A", "B", "C"]
+    assert engine.calls == [["first"], ["a", "b"], ["c"]]
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    engine, scheduler = busy_scheduler(max_batch_size=1, max_queue_size=2)
+    scheduler.submit("a")
+    scheduler.submit("b")
+
+    with pytest.raises(QueueFullError) as e:
+        scheduler.submit("c")
+    # Two queued batches and the one being generated, 10s each by default
+    assert e.value.retry_after == 30
+    engine.gate.set()
+
+
+def test_retry_after_follows_the_batch_time():
+    engine, scheduler = busy_scheduler(max_batch_size=2, max_queue_size=4)
+    engine.gate.set()
+    scheduler.submit("a").result(TIMEOUT)
+    # The running estimate moves toward the near zero measured batch time
+    assert scheduler.batch_time < 10.0
+    assert scheduler.retry_after() <= 8
+
+
+def test_timed_out_request_is_skipped():
+    engine, scheduler = busy_scheduler(max_batch_size=4, timeout=MAX_WAIT)
+
+    async def generate():
+        with pytest.raises(asyncio.TimeoutError):
+            await scheduler.generate("late")
+
+    asyncio.run(generate())
+    kept = scheduler.submit("kept")
+    engine.gate.set()
+
+    assert kept.result(TIMEOUT) == "KEPT"
+    assert engine.calls == [["first"], ["kept"]]
+
+
+def test_cancelled_request_is_skipped():
+    engine, scheduler = busy_scheduler(max_batch_size=4)
+    cancelled = scheduler.submit("cancelled")
+    kept = scheduler.submit("kept")
+    assert cancelled.cancel()
+    engine.gate.set()
+
+    assert kept.result(TIMEOUT) == "KEPT"
+    assert engine.calls == [["first"], ["kept"]]
+
+
+def test_failing_request_does_not_fail_its_batch():
+    engine, scheduler = busy_scheduler(max_batch_size=4)
+    before = scheduler.submit("before")
+    failing = scheduler.submit("failing", seed=-1)
+    after = scheduler.submit("after")
+    engine.gate.set()
+
+    assert before.result(TIMEOUT) == "BEFORE"
+    assert after.result(TIMEOUT) == "AFTER"
+    with pytest.raises(ValueError):
+        failing.result(TIMEOUT)
+    # The failed batch is generated again one prompt at a time
+    assert engine.calls[1:] == [
+        ["before", "failing", "after"],
+        ["before"],
+        ["failing"],
+        ["after"],
+    ]